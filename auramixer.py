@@ -4,54 +4,318 @@ import sys
 import random
 import atexit
 import platform
-import tkinter as tk
-from tkinter import messagebox
+import threading
+import collections
+import hashlib
+import tempfile
+import wave
+import time
+import queue
+import concurrent.futures
+import multiprocessing
+import mmap
+import math
+import array
+import bisect
+import csv
+import json
+import struct
+import socket
+import selectors
+
+try:
+    import numpy # Optional: enables the array blend path for background fades
+except ImportError:
+    numpy = None
 
 # --- Configuration ---
 IS_PORTABLE = True
 CROSSFADE_DURATION_MS = 2000 # Duration for fade-in and fade-out
+EFFECT_STOP_FADE_MS = 1000 # Fade-out applied to effects by stop-all (SPACE)
+BACKGROUND_CHANGE_MS = 10000 # Time each background stays on screen
+BACKGROUND_FADE_MS = 850 # Duration of the crossfade between two backgrounds
+BACKGROUND_FADE_EASING = "linear" # One of FADE_EASINGS
+BACKGROUND_FADE_BLEND = "auto" # "alpha", "numpy" or "auto" to benchmark both at startup
+HOT_RELOAD_POLL_MS = 2000 # How often the media folders are checked for changes
+IDLE_WAIT_MS = 250 # Longest the main loop sleeps while nothing on screen changes
+ACTIVE_POLL_MS = 16 # Wake-up interval while assets are loading or a background change waits
+MIXER_BUFFER_SIZE = 512 # Samples per mixer buffer; smaller lowers latency but needs a faster machine
+MIXER_NUM_CHANNELS = 32 # Two music channels, the rest form the effect voice pool
+EFFECT_MAX_VOICES_PER_SOUND = 4 # Polyphony cap for any single effect
+EFFECT_VOICE_STEALING = "oldest" # Voice replaced when none is free: "oldest" or "quietest"
+MUSIC_STREAM_CHUNK_MS = 500 # Length of each decoded block queued on a music channel
+MUSIC_STREAM_BUFFER_CHUNKS = 4 # Decoded blocks kept ready ahead of playback per stream
+MUSIC_PLAYLIST_MODE = False # Start in playlist mode: tracks advance on their own with sample-accurate crossfades (F6 toggles)
+PLAYLIST_BLOCK_MS = 50 # Blocks the playlist scheduler renders ahead; a track key is heard within two of them
+ASSET_LOADER_WORKERS = min(8, os.cpu_count() or 2) # Threads decoding images and effects
+PCM_CONVERTER_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1)) # Processes converting audio into the PCM cache
+PCM_LONG_TRACK_SECONDS = 600 # Longer files are converted one at a time, in a process of their own, to bound peak memory
+EFFECT_MEMORY_BUDGET_BYTES = 256 * 1024 * 1024 # Decoded effects kept in memory; the least recently played go first
+SLIDESHOW_CACHE_BYTES = 256 * 1024 * 1024 # Memory budget for display-ready backgrounds
+SLIDESHOW_PREFETCH_COUNT = 2 # Upcoming backgrounds prepared ahead of the slideshow
+BACKGROUND_MAX_PIXELS = 100_000_000 # Larger images are rejected from their header instead of being decoded
+PERF_METRICS_FILE = os.environ.get("AURAMIXER_METRICS_FILE") # Periodic metrics dump (.csv, otherwise JSON lines); None disables it
+PERF_DUMP_INTERVAL_MS = 10000 # How often a metrics row is appended to PERF_METRICS_FILE
+PERF_SAMPLE_MS = 500 # How often the perf overlay and the mixer/memory gauges refresh
+PERF_HISTOGRAM_EDGES_MS = (4, 8, 16.7, 33.3, 50, 100) # Frame-time histogram bucket limits
+SESSION_LOG_DIR = os.environ.get("AURAMIXER_SESSION_DIR") # Each session's audio events are logged here for render_session.py; None disables it
+CONTROL_SOCKET_PATH = os.path.join(os.path.expanduser("~"), ".auramixer.sock") # Unix domain socket other processes send commands to
+CONTROL_PORT = 47653 # Localhost TCP port used instead where Unix domain sockets are unavailable
 
-# --- Single Instance Check ---
-def setup_single_instance_lock():
-    lock_file_path = os.path.join(os.path.expanduser("~"), ".auramixer.lock")
+# --- Dialogs ---
+def show_dialog(kind, title, message):
+    # tkinter is slow to import and only needed for these rare dialogs, so it is
+    # imported on first use. kind is a tkinter.messagebox function name.
+    import tkinter as tk
+    from tkinter import messagebox
+    root = tk.Tk(); root.withdraw()
+    getattr(messagebox, kind)(title, message)
+    root.destroy()
 
-    def is_process_alive(pid):
-        if platform.system() == "Windows":
-            try:
-                import subprocess
-                output = subprocess.check_output(
-                    f'tasklist /FI "PID eq {pid}"', stderr=subprocess.DEVNULL, creationflags=0x08000000)
-                return str(pid) in str(output)
-            except (subprocess.CalledProcessError, FileNotFoundError):
-                return False
-        else:
+# --- Control Socket ---
+# Other processes (a show controller, a second launch) drive a running
+# Auramixer through a local socket: a Unix domain socket, or a localhost TCP
+# port where those are unavailable. Each line is a batch of commands separated
+# by ";", for example "effect-volume 0.4; effect 3; music rain". A reader
+# thread parses the lines and queues the batches, then wakes the main loop,
+# which runs every batch queued since the last frame and hands back each
+# line's reply: "ok", or "error: ..." naming what it could not find or do.
+# Lines that arrive before the main loop runs (while assets load) are
+# answered "queued" and run once it starts. Whoever binds the socket is the
+# running instance, so it doubles as the single-instance lock.
+def parse_switch(text):
+    if text.lower() not in ("on", "off"):
+        raise ValueError(f"expected on or off, not '{text}'")
+    return text.lower() == "on"
+
+CONTROL_COMMANDS = { # Command -> argument parser (None: takes no argument)
+    "effect": lambda text: int(text) if text.isdigit() else text, # Number counted across all banks, from 1, or file name
+    "music": lambda text: int(text) if text.isdigit() else text,
+    "stop": None,
+    "music-volume": lambda text: min(1.0, max(0.0, float(text))),
+    "effect-volume": lambda text: min(1.0, max(0.0, float(text))),
+    "effect-bank": int, # Banks to step, e.g. 1 or -1
+    "music-bank": int,
+    "playlist": parse_switch, # on or off
+    "rescan": None,
+    "quit": None,
+    "ping": None,
+}
+
+def control_address():
+    if hasattr(socket, "AF_UNIX") and platform.system() != "Windows":
+        return socket.AF_UNIX, CONTROL_SOCKET_PATH
+    return socket.AF_INET, ("127.0.0.1", CONTROL_PORT)
+
+def parse_control_commands(text):
+    # Returns [(command, argument)]; raises ValueError for anything malformed.
+    commands = []
+    for part in text.replace("\n", ";").split(";"):
+        words = part.split(None, 1)
+        if not words:
+            continue
+        name, argument = words[0].lower(), (words[1].strip() if len(words) > 1 else None)
+        if name not in CONTROL_COMMANDS:
+            raise ValueError(f"unknown command '{name}'")
+        parse = CONTROL_COMMANDS[name]
+        if (parse is None) != (argument is None):
+            raise ValueError(f"'{name}' takes {'no' if parse is None else 'one'} argument")
+        commands.append((name, parse(argument) if parse else None))
+    return commands
+
+def send_control_command(text, address=None, timeout=1.0):
+    # Returns the running instance's reply; raises OSError if none answers.
+    family, target = address or control_address()
+    with socket.socket(family, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(target)
+        connection.sendall(text.replace("\n", ";").encode() + b"\n")
+        reply = b""
+        while not reply.endswith(b"\n"):
+            chunk = connection.recv(4096)
+            if not chunk:
+                raise ConnectionError("The running instance closed the connection")
+            reply += chunk
+    return reply.decode().strip()
+
+class ControlServer:
+    def __init__(self, address=None):
+        self.family, self.address = address or control_address()
+        self.wake_event = None # Event type posted when commands arrive; set by the main loop while it runs
+        self.commands = queue.Queue() # ([(command, argument)], received_at, reply slot or None) batches
+        self._replies = {} # Connection -> reply slots ([text or None]) in the order its lines came in
+        self._half_closed = set() # Connections whose sender is done writing; closed once their replies are sent
+        self._wake_reader = self._wake_writer = None # Lets the main loop wake the reader thread to send replies
+        self._listener = None
+        self._stopping = False
+        self._thread = None
+
+    def start(self):
+        # Raises OSError when the address is taken, normally by a running instance.
+        listener = socket.socket(self.family, socket.SOCK_STREAM)
+        try:
+            listener.bind(self.address)
+            listener.listen()
+        except OSError:
+            listener.close()
+            raise
+        listener.setblocking(False)
+        self._listener = listener
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._wake_reader.setblocking(False)
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self
+
+    def remove_stale(self):
+        # A Unix socket file outlives a crashed instance; nothing answers on it.
+        if self.family != getattr(socket, "AF_UNIX", None):
+            return False
+        try:
+            os.remove(self.address)
+            return True
+        except OSError:
+            return False
+
+    def _serve(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self._listener, selectors.EVENT_READ)
+        selector.register(self._wake_reader, selectors.EVENT_READ)
+        buffers = {}
+        while not self._stopping:
+            for key, _ in selector.select(timeout=0.25):
+                if key.fileobj is self._wake_reader: # Replies were filled in by the main loop
+                    try:
+                        self._wake_reader.recv(4096)
+                    except OSError:
+                        pass
+                    for connection in list(self._replies):
+                        self._send_replies(connection)
+                    continue
+                if key.fileobj is self._listener:
+                    try:
+                        connection, _ = self._listener.accept()
+                    except OSError:
+                        continue
+                    connection.setblocking(False)
+                    selector.register(connection, selectors.EVENT_READ)
+                    buffers[connection], self._replies[connection] = b"", collections.deque()
+                    continue
+                connection = key.fileobj
+                try:
+                    data = connection.recv(4096)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    data = b""
+                if data:
+                    *lines, buffers[connection] = (buffers[connection] + data).split(b"\n")
+                    self._replies[connection].extend(self._handle(line.decode(errors="replace")) for line in lines if line.strip())
+                if len(buffers[connection]) > 65536:
+                    selector.unregister(connection); connection.close()
+                    del buffers[connection], self._replies[connection]
+                    continue
+                if not data: # Such as `echo stop | nc -U`: stop reading, but still answer what was sent
+                    selector.unregister(connection)
+                    del buffers[connection]
+                    self._half_closed.add(connection)
+                self._send_replies(connection)
+        for connection in list(self._replies):
+            self._send_replies(connection) # Such as the reply to "quit"
+            connection.close()
+        selector.close()
+
+    def _send_replies(self, connection):
+        # Sends the replies that are ready, stopping at the first line still waiting for the main loop.
+        slots, ready = self._replies[connection], []
+        while slots and slots[0][0] is not None:
+            ready.append(slots.popleft()[0])
+        if ready:
             try:
-                os.kill(pid, 0)
-                return True
+                connection.sendall("".join(reply + "\n" for reply in ready).encode())
             except OSError:
-                return False
+                pass # The sender did not wait for the reply
+        if connection in self._half_closed and not slots:
+            self._half_closed.discard(connection)
+            del self._replies[connection]
+            connection.close()
 
-    if os.path.exists(lock_file_path):
+    def _handle(self, line):
+        # Returns the line's reply slot; batches for the main loop are answered once it has run them.
+        received_at = time.perf_counter()
         try:
-            with open(lock_file_path, "r") as f:
-                pid = int(f.read().strip())
-            if is_process_alive(pid):
-                root = tk.Tk()
-                root.withdraw()
-                messagebox.showerror("Auramixer Error", "Another instance of Auramixer is already running.")
-                root.destroy()
-                sys.exit(1)
-            else:
-                os.remove(lock_file_path)
-        except (IOError, ValueError):
+            commands = parse_control_commands(line)
+        except ValueError as error:
+            return [f"error: {error}"]
+        commands = [command for command in commands if command[0] != "ping"]
+        if not commands:
+            return ["pong auramixer"]
+        wake_event = self.wake_event
+        if wake_event is None:
+            self.commands.put((commands, received_at, None)) # Runs once the main loop starts
+            return ["queued"]
+        slot = [None]
+        self.commands.put((commands, received_at, slot))
+        try:
+            pygame.event.post(pygame.event.Event(wake_event))
+        except pygame.error:
+            pass # The loop still drains the batch on its next frame
+        return slot
+
+    def reply(self, slot, text):
+        # Called by the main loop once a batch has run; slot is None for batches answered "queued".
+        if slot is None:
+            return
+        slot[0] = text
+        try:
+            self._wake_writer.send(b"\0")
+        except OSError:
+            pass # Closing down
+
+    def drain(self):
+        batches = []
+        while True:
             try:
-                os.remove(lock_file_path)
-            except OSError:
-                pass
+                batches.append(self.commands.get_nowait())
+            except queue.Empty:
+                return batches
+
+    def close(self):
+        if self._listener is None:
+            return
+        self._stopping = True
+        if self._thread: self._thread.join()
+        self._listener.close()
+        self._wake_reader.close(); self._wake_writer.close()
+        self._listener = None
+        self.remove_stale()
 
-    with open(lock_file_path, "w") as f:
-        f.write(str(os.getpid()))
-    atexit.register(lambda: os.remove(lock_file_path) if os.path.exists(lock_file_path) else None)
+def setup_single_instance_lock(command=None, address=None):
+    # Returns the ControlServer of this instance, or None if another program
+    # holds the TCP port. With another instance running, its command (if any)
+    # is forwarded and this process exits.
+    server = ControlServer(address)
+    for _ in range(2):
+        try:
+            server.start()
+            atexit.register(server.close)
+            return server
+        except OSError:
+            try:
+                is_auramixer = send_control_command("ping", address) == "pong auramixer"
+            except OSError:
+                if server.remove_stale(): continue # Left behind by a crash; take it over
+                return None
+            if not is_auramixer:
+                return None # Something else owns the port; run without remote control
+            if command:
+                reply = send_control_command(command, address, timeout=5.0)
+                if reply not in ("ok", "queued"):
+                    print(f"Auramixer: {reply}", file=sys.stderr)
+                sys.exit(0 if reply in ("ok", "queued") else 2)
+            show_dialog("showerror", "Auramixer Error", "Another instance of Auramixer is already running.")
+            sys.exit(1)
+    return None
 
 # --- Path and Asset Management ---
 def get_resource_path(relative_path):
@@ -81,83 +345,2196 @@ def setup_asset_paths(is_portable):
         os.makedirs(paths[path_key], exist_ok=True)
     return paths, needs_user_notification
 
-def load_all_assets(asset_paths):
-    missing_asset_types = []
-    backgrounds_path = asset_paths["backgrounds"]
-    effects_path = asset_paths["effects"]
-    music_path = asset_paths["music"]
-    valid_audio_ext = ('.wav', '.mp3', '.ogg', '.flac')
+def get_cache_path(asset_paths, name):
+    # Derived data lives in a hidden folder next to the media folders; tests and
+    # callers without a base path fall back to the system temp folder.
+    base_path = asset_paths.get("base") or os.path.join(tempfile.gettempdir(), "auramixer")
+    return os.path.join(base_path, ".cache", name)
 
-    # Load Backgrounds
-    background_images = []
-    valid_bg_ext = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
-    try:
-        for f in os.listdir(backgrounds_path):
-            if f.lower().endswith(valid_bg_ext):
+# --- PCM Cache ---
+# Audio is decoded and resampled once into the mixer's own format and kept as
+# raw files under .cache/audio. Later launches map those files and hand them to
+# the mixer as they are, so MP3, OGG and FLAC files are never decoded twice.
+def get_mixer_format():
+    frequency, size, channels = pygame.mixer.get_init()
+    return frequency, size, channels
+
+def convert_to_pcm(source, entry_path):
+    # Runs in a converter process with the mixer open in the player's format.
+    # The decoded chunk is written through its buffer; get_raw() would copy all of it a second time.
+    sound = pygame.mixer.Sound(source)
+    raw_data = memoryview(sound)
+    if not raw_data.nbytes:
+        raise pygame.error(f"No audio in {source}")
+    temp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(raw_data)
+    raw_data.release()
+    os.replace(temp_path, entry_path)
+    return entry_path
+
+def init_pcm_converter(mixer_format):
+    # Converter processes open a silent mixer; only its format matters for decoding.
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    frequency, size, channels = mixer_format
+    pygame.mixer.init(frequency, size, channels)
+
+class PcmCache:
+    # One raw PCM file per audio source, keyed by the source's path, mtime and
+    # size and the mixer format, so a changed file or different mixer settings
+    # never hit a stale entry. Conversions run on process pools started on
+    # demand; loading an entry waits for its conversion, or queues one and
+    # waits for that. Audio is never decoded in the player process itself.
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._pending = {} # entry path -> Future from the converter pool
+        self._live_entries = set()
+        self._converters = {False: None, True: None} # Long file -> ProcessPoolExecutor
+        self._lock = threading.Lock()
+
+    def entry_path(self, source, mixer_format=None):
+        stat = os.stat(source)
+        key = f"{os.path.abspath(source)}|{stat.st_mtime_ns}|{stat.st_size}|{mixer_format or get_mixer_format()}"
+        entry = os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".pcm")
+        self._live_entries.add(entry)
+        return entry
+
+    def missing(self, source):
+        entry = self.entry_path(source)
+        return not os.path.exists(entry) and entry not in self._pending
+
+    def converter(self, long_file=False):
+        # Files over PCM_LONG_TRACK_SECONDS decode to hundreds of MB, so they
+        # queue for a single process of their own instead of several at once.
+        with self._lock:
+            if self._converters[long_file] is None:
+                # Spawned rather than forked, so no process inherits the open audio device.
+                self._converters[long_file] = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=1 if long_file else PCM_CONVERTER_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=init_pcm_converter, initargs=(get_mixer_format(),))
+            return self._converters[long_file]
+
+    def submit(self, source, seconds=0):
+        entry = self.entry_path(source)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        long_file = seconds > PCM_LONG_TRACK_SECONDS
+        try:
+            future = self.converter(long_file).submit(convert_to_pcm, source, entry)
+        except RuntimeError: # A converter process died and broke the pool; start a fresh one
+            with self._lock:
+                self._converters[long_file] = None
+            future = self.converter(long_file).submit(convert_to_pcm, source, entry)
+        self._pending[entry] = future
+        return future
+
+    def ensure(self, source):
+        entry = self.entry_path(source)
+        future = self._pending.pop(entry, None)
+        if future is not None:
+            try:
+                future.result()
+            except (concurrent.futures.CancelledError, concurrent.futures.BrokenExecutor):
+                pass # The pool went away; converted again below
+        if not os.path.exists(entry):
+            # Nothing says how long the file is, so it takes the one-at-a-time process.
+            future = self.submit(source, math.inf)
+            self._pending.pop(entry, None)
+            try:
+                future.result()
+            except (concurrent.futures.CancelledError, concurrent.futures.BrokenExecutor) as error:
+                raise OSError(f"Could not convert {source}") from error
+        return entry
+
+    def load_sound(self, source):
+        # The mapped file goes straight into the mixer; pygame copies it into
+        # its own chunk, so the map is closed again right away.
+        with open(self.ensure(source), "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return pygame.mixer.Sound(buffer=mapped)
+
+    def open_pcm(self, source):
+        return PcmReader(open(self.ensure(source), "rb"))
+
+    def cancel_pending(self):
+        for future in self._pending.values():
+            future.cancel()
+
+    def release_converters(self, cancel=False):
+        # Idle converter processes exit once their queued work is done; a later conversion starts new ones.
+        with self._lock:
+            converters, self._converters = self._converters.values(), {False: None, True: None}
+        for converter in converters:
+            if converter: converter.shutdown(wait=False, cancel_futures=cancel)
+
+    def evict_stale(self):
+        # Removes entries not used this session (old versions of changed files, other mixer formats).
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            if path not in self._live_entries and not name.endswith(".tmp"):
+                try: os.remove(path)
+                except OSError: pass
+
+# --- Streaming Music Engine ---
+
+class PcmReader:
+    # Sequential reader over raw PCM that already matches the mixer format.
+    def __init__(self, file_obj, data_offset=0):
+        self._file = file_obj
+        self._data_offset = data_offset
+        self._file.seek(data_offset)
+        self.total_bytes = os.fstat(file_obj.fileno()).st_size - data_offset
+
+    def read(self, num_bytes):
+        return self._file.read(num_bytes)
+
+    def rewind(self):
+        self._file.seek(self._data_offset)
+
+    def close(self):
+        self._file.close()
+
+class WavPcmReader:
+    # Reads PCM frames straight out of a WAV file whose format matches the mixer.
+    def __init__(self, wav_file, frame_size):
+        self._wav = wav_file
+        self._frame_size = frame_size
+        self.total_bytes = wav_file.getnframes() * frame_size
+
+    def read(self, num_bytes):
+        return self._wav.readframes(num_bytes // self._frame_size)
+
+    def rewind(self):
+        self._wav.rewind()
+
+    def close(self):
+        self._wav.close()
+
+class MusicTrack:
+    # A music file that is only decoded while it plays. WAV files in the mixer's
+    # format are read directly; anything else is converted once into the PCM
+    # cache and streamed from there on every play.
+    def __init__(self, path, pcm_cache, info=None):
+        self.path = path
+        self.pcm_cache = pcm_cache
+        self.name = os.path.basename(path)
+        self.info = info # The manifest's header probe, when there is one
+
+    def needs_conversion(self, mixer_format):
+        if self.info: # Decided from the probed header without opening the file
+            frequency, size, channels = mixer_format
+            return not (self.info["format"] == "wav" and self.info["codec"] == "pcm" and self.info["rate"] == frequency
+                        and self.info["channels"] == channels and self.info["bits"] == abs(size) and (size < 0) == (self.info["bits"] > 8))
+        reader = self._open_matching_wav(mixer_format) if self.path.lower().endswith(".wav") else None
+        if reader:
+            reader.close()
+        return reader is None
+
+    def _open_matching_wav(self, mixer_format):
+        frequency, size, channels = mixer_format
+        try:
+            wav_file = wave.open(self.path, "rb")
+        except (wave.Error, EOFError, OSError):
+            return None
+        sample_width = wav_file.getsampwidth()
+        # 8-bit WAV data is unsigned and wider samples are signed, like the mixer's sign flag.
+        if (wav_file.getframerate() == frequency and wav_file.getnchannels() == channels
+                and sample_width * 8 == abs(size) and (size < 0) == (sample_width > 1)):
+            return WavPcmReader(wav_file, sample_width * channels)
+        wav_file.close()
+        return None
+
+    def open_pcm(self):
+        if self.path.lower().endswith(".wav"):
+            reader = self._open_matching_wav(get_mixer_format())
+            if reader:
+                return reader
+        return self.pcm_cache.open_pcm(self.path)
+
+def halt_channel(channel):
+    # Stopping a channel starts whatever block is queued on it, so stop twice.
+    channel.stop()
+    if channel.get_busy():
+        channel.stop()
+
+# A music channel belongs to the stream or scheduler that last started playing
+# on it. Only the owner may queue on it or halt it, so a stream that is still
+# opening its track when it is stopped, or that winds down late, cannot cut
+# the one that took the channel over. Stopping never waits for the thread.
+_CHANNEL_OWNERS = {} # Channel -> MusicStream or MusicScheduler
+_CHANNEL_OWNERS_LOCK = threading.Lock()
+
+def feed_channel(channel, owner, sound, stop_event):
+    # Queues sound behind owner's playing block, or starts it and takes the channel over.
+    # Returns True if it started playing, False if queued, None if owner has been stopped.
+    with _CHANNEL_OWNERS_LOCK: # stop() sets stop_event before releasing, so it cannot slip in between
+        if stop_event.is_set():
+            return None
+        if channel.get_busy() and _CHANNEL_OWNERS.get(channel) is owner:
+            channel.queue(sound)
+            return False
+        _CHANNEL_OWNERS[channel] = owner
+        channel.play(sound)
+        return True
+
+def release_channel(channel, owner):
+    # Halts channel if owner still holds it; a no-op once another stream has started on it.
+    with _CHANNEL_OWNERS_LOCK:
+        if _CHANNEL_OWNERS.get(channel) is owner:
+            del _CHANNEL_OWNERS[channel]
+            halt_channel(channel)
+
+class MusicStream:
+    # Feeds one track to one mixer channel from a small ring of decoded blocks so
+    # memory stays flat regardless of track length. Fades are applied as
+    # time-based channel volume ramps because Channel.fadeout would let the
+    # queued block play on at full volume.
+    def __init__(self, track, channel, volume, fade_in_ms=0, loops=-1, on_started=None):
+        self.track = track
+        self.channel = channel
+        self.loops = loops
+        self.on_started = on_started # Called with the time the first block starts playing
+        self._volume = volume
+        self._lock = threading.Lock()
+        self._ring = collections.deque()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"music-{track.name}", daemon=True)
+        self._fade_in_ms = fade_in_ms
+        self._set_gain_ramp(0.0 if fade_in_ms else 1.0, 1.0, fade_in_ms)
+        self._stop_when_silent = False
+
+    def _set_gain_ramp(self, start_gain, end_gain, duration_ms):
+        self._ramp_start_gain, self._ramp_end_gain = start_gain, end_gain
+        self._ramp_start_time, self._ramp_duration = time.perf_counter(), max(0, duration_ms) / 1000
+
+    def _current_gain(self):
+        if not self._ramp_duration:
+            return self._ramp_end_gain
+        progress = min(1.0, (time.perf_counter() - self._ramp_start_time) / self._ramp_duration)
+        return self._ramp_start_gain + (self._ramp_end_gain - self._ramp_start_gain) * progress
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def set_volume(self, volume):
+        with self._lock:
+            self._volume = volume
+
+    def fade_out(self, duration_ms):
+        with self._lock:
+            self._set_gain_ramp(self._current_gain(), 0.0, duration_ms)
+            self._stop_when_silent = True
+
+    def stop(self):
+        # Silences the channel now; the thread notices the event and exits on its own.
+        self._stop_event.set()
+        release_channel(self.channel, self)
+
+    def join(self, timeout=None):
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    @property
+    def finished(self):
+        return not self._thread.is_alive()
+
+    def _run(self):
+        try:
+            reader = self.track.open_pcm()
+        except (pygame.error, OSError, EOFError, wave.Error):
+            return
+        with self._lock:
+            # Opening may have transcoded for a while; start the fade-in with the audio.
+            if not self._stop_when_silent:
+                self._set_gain_ramp(0.0 if self._fade_in_ms else 1.0, 1.0, self._fade_in_ms)
+        frequency, size, channels = get_mixer_format()
+        frame_size = abs(size) // 8 * channels
+        chunk_bytes = max(1, frequency * MUSIC_STREAM_CHUNK_MS // 1000) * frame_size
+        loops_left, end_of_track = self.loops, False
+        try:
+            while not self._stop_event.is_set():
+                # Decode ahead into the ring buffer.
+                while len(self._ring) < MUSIC_STREAM_BUFFER_CHUNKS and not end_of_track:
+                    data = reader.read(chunk_bytes)
+                    data = data[:len(data) - len(data) % frame_size]
+                    if data:
+                        self._ring.append(pygame.mixer.Sound(buffer=data))
+                        continue
+                    reader.rewind()
+                    if loops_left == 0 or not reader.read(frame_size):
+                        end_of_track = True
+                    else:
+                        reader.rewind()
+                        loops_left = loops_left - 1 if loops_left > 0 else loops_left
+
+                # Keep one block queued behind the playing one so the mixer never runs dry.
+                while self._ring and self.channel.get_queue() is None:
+                    started = feed_channel(self.channel, self, self._ring[0], self._stop_event)
+                    if started is None:
+                        break
+                    self._ring.popleft()
+                    if started and self.on_started:
+                        self.on_started(time.perf_counter())
+                        self.on_started = None
+
+                with self._lock:
+                    gain = self._current_gain()
+                    self.channel.set_volume(self._volume * gain)
+                    if self._stop_when_silent and gain <= 0.0:
+                        break
+                if end_of_track and not self._ring and not self.channel.get_busy():
+                    break
+                self._stop_event.wait(0.02)
+        finally:
+            release_channel(self.channel, self)
+            reader.close()
+
+# --- Playlist Scheduler ---
+# Playlist mode plays music on one channel from blocks rendered just in time
+# and queued behind the playing block with Channel.queue, so the mixer joins
+# them without a gap. Every transition sits at an exact sample of that stream:
+# auto-advance starts its crossfade exactly CROSSFADE_DURATION_MS before the
+# track ends, and a track key lands on the first block boundary after the
+# track is open: the track starts opening as the key is handled, and only the
+# block playing and the one queued behind it are ahead of it. Crossfades use
+# equal-power envelopes, computed once per length and mixed into the blocks,
+# so neither the frame rate nor a stalled render loop changes when or how a
+# transition sounds. Mixing needs 16-bit samples; in other mixer formats
+# transitions are gapless cuts instead.
+_ENVELOPES = collections.OrderedDict()
+ENVELOPE_CACHE_SIZE = 8 # Fade tables kept; each track length can need one of its own
+
+def fade_envelope(length, curve):
+    # Gains for one fade, padded with the gain before and after it: "in" and
+    # "out" are the equal-power sine and cosine quarter turns, "linear" is the
+    # straight fade-out MusicStream.fade_out uses. Computed on the scheduler
+    # thread, so with NumPy a table of a few seconds takes well under a millisecond.
+    key = (length, curve)
+    if key not in _ENVELOPES:
+        before, after = (0.0, 1.0) if curve == "in" else (1.0, 0.0)
+        if numpy is not None:
+            x = (numpy.arange(length) + 0.5) / length
+            shape = {"in": lambda: numpy.sin(x * math.pi / 2), "out": lambda: numpy.cos(x * math.pi / 2), "linear": lambda: 1.0 - x}[curve]
+            _ENVELOPES[key] = numpy.concatenate(([before], shape(), [after])).astype(numpy.float32)
+        else:
+            shape = {"in": lambda x: math.sin(x * math.pi / 2), "out": lambda x: math.cos(x * math.pi / 2), "linear": lambda x: 1.0 - x}[curve]
+            _ENVELOPES[key] = [before] + [shape((i + 0.5) / length) for i in range(length)] + [after]
+        if len(_ENVELOPES) > ENVELOPE_CACHE_SIZE:
+            _ENVELOPES.popitem(last=False)
+    _ENVELOPES.move_to_end(key)
+    return _ENVELOPES[key]
+
+def envelope_gains(fade, first_frame, count):
+    # Gains of the stream frames first_frame .. first_frame + count under a (start frame, length, curve) fade.
+    start, length, curve = fade
+    table = fade_envelope(length, curve)
+    offset = first_frame - start + 1
+    if numpy is not None:
+        return table[numpy.clip(numpy.arange(offset, offset + count), 0, length + 1)]
+    return [table[min(max(i, 0), length + 1)] for i in range(offset, offset + count)]
+
+def mix_pcm16(parts, frame_count, channels):
+    # Sums (frame offset, 16-bit PCM, per-frame gains or None) parts into one block, clipping the result.
+    if numpy is not None:
+        out = numpy.zeros(frame_count * channels, numpy.float32)
+        for offset, data, gains in parts:
+            samples = numpy.frombuffer(data, numpy.int16).astype(numpy.float32)
+            if gains is not None:
+                samples = (samples.reshape(-1, channels) * gains[:, None]).ravel()
+            out[offset * channels:offset * channels + len(samples)] += samples
+        return numpy.clip(out, -32768, 32767).astype(numpy.int16).tobytes()
+    out = [0.0] * (frame_count * channels)
+    for offset, data, gains in parts:
+        base = offset * channels
+        for i, sample in enumerate(array.array("h", data)):
+            out[base + i] += sample if gains is None else sample * gains[i // channels]
+    return array.array("h", (max(-32768, min(32767, int(value))) for value in out)).tobytes()
+
+class PlaylistStats:
+    # Written by scheduler threads, read by the benchmark. Jitter is how far a
+    # transition was heard from where the length of the block before it placed
+    # it, so anything that delays the stream (an underrun) shows up in it; it is
+    # only observed every MusicScheduler.POLL_S, so a few ms of it is polling.
+    def __init__(self):
+        self.transitions = 0
+        self.underruns = 0
+        self.transition_jitter_ms = collections.deque(maxlen=1000)
+
+class PlaylistVoice:
+    # One track inside the scheduled stream, with the stream frame it starts at
+    # and its fades. position counts the frames read in the current pass.
+    def __init__(self, track, reader, start, frame_size, loop):
+        self.track, self.reader, self.start, self.loop = track, reader, start, loop
+        self.frame_size = frame_size
+        self.total = reader.total_bytes // frame_size
+        self.position = 0
+        self.fade_in = self.fade_out = None # (start frame, length, curve)
+        self.finished = False
+
+    def read(self, frames):
+        chunks = []
+        while frames > 0:
+            data = self.reader.read(frames * self.frame_size)
+            data = data[:len(data) - len(data) % self.frame_size]
+            chunks.append(data)
+            got = len(data) // self.frame_size
+            self.position += got
+            frames -= got
+            if frames > 0: # End of the track
+                if self.loop and self.position:
+                    self.reader.rewind()
+                    self.position = 0
+                else:
+                    self.finished = True
+                    break
+        return b"".join(chunks)
+
+    def end_frame(self, at):
+        # Stream frame this pass of the track ends on, seen from the next frame to render.
+        return max(at, self.start) + self.total - self.position
+
+    def gains(self, first_frame, count):
+        gains = None
+        for fade in (self.fade_in, self.fade_out):
+            if fade and fade[0] < first_frame + count and first_frame < fade[0] + fade[1]:
+                part = envelope_gains(fade, first_frame, count)
+                gains = part if gains is None else gains * part if numpy is not None else [a * b for a, b in zip(gains, part)]
+        return gains
+
+class MusicScheduler:
+    # Plays the music list as a playlist through one channel. The interface
+    # matches MusicStream (start, set_volume, fade_out, stop, finished) so the
+    # AudioEngine can hand over between the two; play(), set_auto_advance() and
+    # set_tracks() are only applied at block boundaries, from the scheduler
+    # thread, which works from its own copy of the music list.
+    POLL_S = 0.005 # How often the thread checks whether the queued block started
+
+    def __init__(self, tracks, track, channel, volume, fade_in_ms=0, crossfade_ms=CROSSFADE_DURATION_MS, block_ms=PLAYLIST_BLOCK_MS,
+                 auto_advance=True, triggered_at=None, on_transition=None, stats=None):
+        self.tracks = list(tracks) # The music list as of the last set_tracks(); the next track is looked up in it
+        self.channel = channel
+        self.on_transition = on_transition # Called from the thread with (scheduler, track, audible time, triggered_at, crossfade_ms)
+        self.stats = stats or PlaylistStats()
+        self.closing = False
+        self._volume = volume
+        self._auto_advance = auto_advance
+        frequency, size, channels = get_mixer_format()
+        self._rate, self._channels, self._frame_size = frequency, channels, abs(size) // 8 * channels
+        self._can_mix = size == -16
+        self._silence = b"\x80" if size == 8 else b"\x00"
+        self._crossfade = frequency * crossfade_ms // 1000 if self._can_mix else 0
+        self._block = max(1, frequency * block_ms // 1000)
+        self._voices = []
+        self._position = 0 # Next stream frame to render
+        self._requests = queue.SimpleQueue()
+        self._opening = None # (track, future, triggered_at, fade frames) of a requested track
+        self._upcoming = None # (track, future) of the track auto-advance goes to next
+        self._block_transitions = [] # (stream frame, track, triggered_at, fade frames) in the block being rendered
+        self._opener = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="playlist-open")
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="playlist", daemon=True)
+        self.play(track, triggered_at, fade_in_ms)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def play(self, track, triggered_at=None, fade_ms=None):
+        # The track starts opening now, so it is ready by the next block boundary rather than one block later.
+        fade = self._crossfade if fade_ms is None else (self._rate * fade_ms // 1000 if self._can_mix else 0)
+        try:
+            future = self._opener.submit(track.open_pcm)
+        except RuntimeError:
+            return # The scheduler has already finished
+        self._requests.put(("play", (track, future, triggered_at, fade)))
+
+    def set_auto_advance(self, enabled):
+        self._requests.put(("advance", enabled))
+
+    def set_tracks(self, tracks):
+        # Called after the music list changed; the copy is handed to the scheduler thread.
+        self._requests.put(("tracks", list(tracks)))
+
+    def set_volume(self, volume):
+        self._volume = volume
+        self.channel.set_volume(volume)
+
+    def fade_out(self, duration_ms):
+        self.closing = True
+        self._requests.put(("fade_out", self._rate * duration_ms // 1000 if self._can_mix else 0))
+
+    def stop(self):
+        self.closing = True
+        self._stop_event.set()
+        release_channel(self.channel, self)
+        if self._thread.ident is None: # Never started, so _run will not clean up
+            self._drop_requests()
+            self._opener.shutdown(wait=False, cancel_futures=True)
+
+    def join(self, timeout=None):
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    @property
+    def finished(self):
+        return not self._thread.is_alive()
+
+    def _discard(self, future):
+        # Closes the reader of a track that was opened but will not be played.
+        future.add_done_callback(lambda done: done.exception() is None and done.result().close())
+
+    def _drop_requests(self):
+        # Closes the tracks opened for play requests that were never applied.
+        while True:
+            try:
+                kind, value = self._requests.get_nowait()
+            except queue.Empty:
+                return
+            if kind == "play": self._discard(value[1])
+
+    def _prefetch_after(self, track):
+        # Opens the track after this one (converting it if needed) while this one plays.
+        if self._upcoming:
+            self._discard(self._upcoming[1])
+        self._upcoming = None
+        if self.tracks:
+            next_track = self.tracks[(self.tracks.index(track) + 1) % len(self.tracks)] if track in self.tracks else self.tracks[0]
+            self._upcoming = (next_track, self._opener.submit(next_track.open_pcm))
+
+    def _start_voice(self, track, reader, at, fade, triggered_at):
+        for voice in self._voices:
+            if voice.fade_out is None or voice.fade_out[0] + voice.fade_out[1] > at + fade:
+                voice.fade_out = (at, fade, "out")
+        voice = PlaylistVoice(track, reader, at, self._frame_size, loop=not self._auto_advance)
+        if fade: voice.fade_in = (at, fade, "in")
+        self._voices.append(voice)
+        self._block_transitions.append((at, track, triggered_at, fade))
+        self._prefetch_after(track)
+
+    def _schedule(self, at, frames):
+        # Applies requests and starts the transitions that fall into the `frames` frames from stream frame `at`.
+        while True:
+            try:
+                kind, value = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "play":
+                if self._opening: self._discard(self._opening[1])
+                self._opening = value
+                if self.closing:
+                    self._discard(value[1])
+                    self._opening = None
+            elif kind == "tracks":
+                self.tracks = value
+            elif kind == "advance":
+                self._auto_advance = value
+                if self._voices: self._voices[-1].loop = not value # Without auto-advance the track loops, as in normal mode
+            elif kind == "fade_out":
+                for voice in self._voices:
+                    if voice.fade_out is None or voice.fade_out[0] + voice.fade_out[1] > at + value:
+                        voice.fade_out = (at, value, "linear")
+                for pending in (self._opening, self._upcoming):
+                    if pending: self._discard(pending[1])
+                self._opening = self._upcoming = None
+
+        if self._opening and self._opening[1].done():
+            track, future, triggered_at, fade = self._opening
+            self._opening = None
+            try:
+                self._start_voice(track, future.result(), at, fade, triggered_at)
+            except (pygame.error, OSError, EOFError, wave.Error):
+                pass # Unplayable now; the current track carries on
+        elif self._auto_advance and self._upcoming and not (self._voices and self._voices[-1].fade_out):
+            # With nothing left playing (the next track took longer to open than this one to end) it starts right away.
+            current = self._voices[-1] if self._voices else None
+            fade = min(self._crossfade, current.total // 2) if current else 0
+            starts_at = current.end_frame(at) - fade if current else at
+            if starts_at < at + frames and self._upcoming[1].done():
+                track, future = self._upcoming
+                self._upcoming = None
                 try:
-                    img = pygame.image.load(os.path.join(backgrounds_path, f)).convert()
-                    background_images.append(img)
-                except pygame.error:
-                    continue
-    except OSError:
-        pass # Handled by the check below
+                    self._start_voice(track, future.result(), max(at, starts_at), fade, None)
+                except (pygame.error, OSError, EOFError, wave.Error):
+                    self._prefetch_after(track) # Skip a track that cannot be played
+
+    def _render_block(self):
+        # Returns the next block, b"" if there is nothing to queue yet, or None once the playlist is over.
+        # A track ending inside a block does not cut the block short, so the thread always has a whole
+        # block's time to queue the one after it.
+        pieces, frames = [], self._block
+        while frames > 0:
+            at = self._position
+            self._schedule(at, frames)
+            if not self._voices:
+                break
+            piece = self._render_piece(at, frames)
+            self._position += len(piece) // self._frame_size
+            frames -= len(piece) // self._frame_size
+            if piece: pieces.append(piece)
+        if pieces:
+            return b"".join(pieces)
+        return None if self.closing or not (self._opening or self._upcoming) else b""
+
+    def _render_piece(self, at, frames):
+        # Mixes up to `frames` frames from stream frame `at`, stopping early where the last voice ends.
+        parts = []
+        for voice in self._voices:
+            offset = max(0, voice.start - at)
+            count = frames - offset
+            if voice.fade_out: count = min(count, voice.fade_out[0] + voice.fade_out[1] - (at + offset))
+            data = voice.read(count) if count > 0 else b""
+            parts.append((offset, data, voice.gains(at + offset, len(data) // self._frame_size)))
+        ended = [voice for voice in self._voices if voice.finished or (voice.fade_out and voice.fade_out[0] + voice.fade_out[1] <= at + frames)]
+        for voice in ended:
+            voice.reader.close()
+        self._voices = [voice for voice in self._voices if voice not in ended]
+        length = max(offset + len(data) // self._frame_size for offset, data, _ in parts)
+        if not length:
+            return b"" # Every voice ended exactly at the boundary; the caller schedules again from here
+        if len(parts) == 1 and parts[0][0] == 0 and parts[0][2] is None:
+            return parts[0][1]
+        if self._can_mix:
+            return mix_pcm16(parts, length, self._channels)
+        block = bytearray(self._silence * (length * self._frame_size)) # Cuts only: the parts do not overlap
+        for offset, data, _ in parts:
+            block[offset * self._frame_size:offset * self._frame_size + len(data)] = data
+        return bytes(block)
+
+    def _run(self):
+        self.channel.set_volume(self._volume)
+        playing = queued = None # (start frame, frames, transitions) of the block playing and the one queued behind it
+        playing_started = None
+        try:
+            while not self._stop_event.is_set():
+                if self.channel.get_queue() is None:
+                    now = time.perf_counter()
+                    if queued: # The queued block started playing since the last check
+                        expected = playing_started + playing[1] / self._rate
+                        playing, queued, playing_started = queued, None, now
+                        self._heard(playing, now, expected)
+                    self._block_transitions = []
+                    start_frame = self._position
+                    block = self._render_block()
+                    if block is None:
+                        if not self.channel.get_busy():
+                            break
+                    elif block:
+                        sound = pygame.mixer.Sound(buffer=block)
+                        info = (start_frame, len(block) // self._frame_size, self._block_transitions)
+                        started = feed_channel(self.channel, self, sound, self._stop_event)
+                        if started is None:
+                            break
+                        if not started:
+                            queued = info
+                            starts_at = playing_started + playing[1] / self._rate
+                        else:
+                            # The stream ran dry before this block was ready, so it is late by the gap.
+                            expected = playing_started + playing[1] / self._rate if playing else now
+                            if playing: self.stats.underruns += 1
+                            playing, playing_started = info, now
+                            starts_at = now
+                            self._heard(playing, now, expected)
+                        for frame, track, triggered_at, fade in info[2]:
+                            if self.on_transition:
+                                self.on_transition(self, track, starts_at + (frame - start_frame) / self._rate, triggered_at, fade * 1000 / self._rate)
+                self._stop_event.wait(self.POLL_S)
+        finally:
+            self.closing = True # Whatever ended the playlist, the engine starts a new scheduler for the next track
+            release_channel(self.channel, self)
+            for voice in self._voices:
+                voice.reader.close()
+            for pending in (self._opening, self._upcoming):
+                if pending: self._discard(pending[1])
+            self._drop_requests()
+            self._opener.shutdown(wait=False)
+
+    def _heard(self, block, started, expected):
+        # Transitions sit at exact frames inside their block, so each is as late as the block that carries it.
+        for _ in block[2]:
+            self.stats.transitions += 1
+            self.stats.transition_jitter_ms.append((started - expected) * 1000)
 
-    if not background_images:
-        missing_asset_types.append('backgrounds')
+# --- Backgrounds ---
+VALID_BACKGROUND_EXT = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+VALID_AUDIO_EXT = ('.wav', '.mp3', '.ogg', '.flac')
+ASSET_CATEGORIES = ("backgrounds", "effects", "music")
 
-    # Load Effects
-    effect_sounds = []
+def list_asset_files(folder, extensions):
+    # Sorted by name so keys and banks map to the same files on every launch.
     try:
-        for f in os.listdir(effects_path):
-            if f.lower().endswith(valid_audio_ext):
-                try:
-                    sound = pygame.mixer.Sound(os.path.join(effects_path, f))
-                    effect_sounds.append(sound)
-                except pygame.error:
-                    continue
+        return [os.path.join(folder, f) for f in sorted(os.listdir(folder), key=str.lower) if f.lower().endswith(extensions)]
     except OSError:
-        pass
+        return []
 
-    if not effect_sounds:
-        missing_asset_types.append('effects')
-    
-    # Load Music
-    music_sounds = []
-    try:
-        for f in os.listdir(music_path):
-            if f.lower().endswith(valid_audio_ext):
+def scale_and_crop_image(img, target_size):
+    # Scale to cover the target (like CSS background-size: cover) and crop the overflow.
+    target_width, target_height = target_size
+    if img.get_size() == (target_width, target_height):
+        return img
+    img_aspect, screen_aspect = img.get_width() / img.get_height(), target_width / target_height
+    new_width, new_height = (int(target_height * img_aspect), target_height) if img_aspect > screen_aspect else (target_width, int(target_width / img_aspect))
+    scaled = pygame.transform.scale(img, (new_width, new_height))
+    x_offset, y_offset = (new_width - target_width) // 2, (new_height - target_height) // 2
+    return scaled.subsurface(pygame.Rect(x_offset, y_offset, target_width, target_height))
+
+class BackgroundCache:
+    # Backgrounds already cropped and scaled to the display, stored as raw RGB so
+    # a warm start skips both the image decode and the scaling. Entries are keyed
+    # by source path, mtime, size and target resolution; whatever a completed
+    # scan did not ask for is stale and gets evicted.
+    def __init__(self, cache_dir, target_size):
+        self.cache_dir = cache_dir
+        self.target_size = tuple(target_size)
+        self._live_entries = set()
+
+    def entry_path(self, source_path):
+        stat = os.stat(source_path)
+        width, height = self.target_size
+        key = f"{os.path.abspath(source_path)}|{stat.st_mtime_ns}|{stat.st_size}|{width}x{height}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".rgb")
+
+    def load(self, source_path):
+        entry_path = self.entry_path(source_path)
+        self._live_entries.add(os.path.basename(entry_path))
+        width, height = self.target_size
+        try:
+            with open(entry_path, "rb") as f:
+                data = f.read()
+            if len(data) == width * height * 3:
+                return pygame.image.frombytes(data, self.target_size, "RGB")
+        except OSError:
+            pass
+
+        surface = scale_and_crop_image(pygame.image.load(source_path), self.target_size)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(pygame.image.tobytes(surface, "RGB"))
+            os.replace(temp_path, entry_path)
+        except OSError:
+            pass # A read-only media folder just means no warm starts
+        return surface
+
+    def prepare(self, source_path):
+        # Makes sure a cache entry exists without reading it back into memory.
+        entry_path = self.entry_path(source_path)
+        width, height = self.target_size
+        try:
+            if os.path.getsize(entry_path) == width * height * 3:
+                self._live_entries.add(os.path.basename(entry_path))
+                return
+        except OSError:
+            pass
+        self.load(source_path)
+
+    def evict_stale(self):
+        try:
+            cached_files = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        for name in cached_files:
+            if name not in self._live_entries:
                 try:
-                    sound = pygame.mixer.Sound(os.path.join(music_path, f))
-                    music_sounds.append(sound)
-                except pygame.error:
-                    continue
-    except OSError:
-        pass
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
 
-    if not music_sounds:
-        missing_asset_types.append('music')
-        
-    assets = {
-        "backgrounds": background_images,
-        "effects": effect_sounds,
-        "music": music_sounds
+class Slideshow:
+    # Keeps only the current and the next few backgrounds resident, in an LRU
+    # bounded by a byte budget. Upcoming images are prepared on a worker thread
+    # and picked up by poll(), so a background change never waits on a decode.
+    def __init__(self, sources, target_size, background_cache=None,
+                 memory_budget=SLIDESHOW_CACHE_BYTES, prefetch_count=SLIDESHOW_PREFETCH_COUNT):
+        self.sources = sources # Paths or ready surfaces; the list may change while running
+        self.target_size = tuple(target_size)
+        self.background_cache = background_cache
+        self.memory_budget = memory_budget
+        self.prefetch_count = prefetch_count
+        self.pinned = set()
+        self.resident_bytes = 0
+        # Keyed by source rather than position, so the list can change under the cache.
+        self._resident = collections.OrderedDict() # source -> surface, least recently used first
+        self._pending = {} # source -> Future
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="slideshow")
+
+    def _prepare(self, source):
+        if isinstance(source, pygame.Surface):
+            surface = scale_and_crop_image(source, self.target_size)
+        elif self.background_cache:
+            surface = self.background_cache.load(source)
+        else:
+            surface = scale_and_crop_image(pygame.image.load(source), self.target_size)
+        # Converting here keeps the pixel-format work off the render thread.
+        return surface.convert() if pygame.display.get_surface() else surface.copy()
+
+    def _store(self, source, surface):
+        self._resident[source] = surface
+        self._resident.move_to_end(source)
+        self.resident_bytes += surface.get_pitch() * surface.get_height()
+        for old_source in list(self._resident):
+            if self.resident_bytes <= self.memory_budget:
+                break
+            if old_source not in self.pinned and old_source is not source:
+                self._drop(old_source)
+
+    def _drop(self, source):
+        surface = self._resident.pop(source)
+        self.resident_bytes -= surface.get_pitch() * surface.get_height()
+
+    def pin(self, *indices):
+        self.pinned = {self.sources[index] for index in indices if 0 <= index < len(self.sources)}
+
+    def forget(self, source):
+        # The file changed or went away; drop anything prepared from the old version.
+        self._pending.pop(source, None)
+        if source in self._resident:
+            self._drop(source)
+
+    @property
+    def busy(self):
+        return bool(self._pending)
+
+    def poll(self):
+        # Results are stored in request order so LRU order follows slideshow order.
+        for source, future in list(self._pending.items()):
+            if not future.done():
+                break
+            del self._pending[source]
+            try:
+                self._store(source, future.result())
+            except (pygame.error, OSError):
+                pass # Unreadable now; it will be retried the next time it comes up
+
+    def request(self, index):
+        if not 0 <= index < len(self.sources):
+            return
+        source = self.sources[index]
+        if source not in self._resident and source not in self._pending:
+            self._pending[source] = self._executor.submit(self._prepare, source)
+
+    def prefetch_after(self, index):
+        for offset in range(1, self.prefetch_count + 1):
+            self.request((index + offset) % len(self.sources))
+
+    def get(self, index):
+        # Returns the surface if it is ready, otherwise schedules it and returns None.
+        self.poll()
+        source = self.sources[index]
+        if source in self._resident:
+            self._resident.move_to_end(source)
+            return self._resident[source]
+        self.request(index)
+        return None
+
+    def load_now(self, index):
+        # Blocking load, only for the very first frame.
+        self.request(index)
+        if self.sources[index] in self._pending:
+            concurrent.futures.wait([self._pending[self.sources[index]]])
+        return self.get(index)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+# --- Effect Memory Budget ---
+class EffectSample:
+    # An effect that has been converted into the PCM cache. Its samples are only
+    # in memory while the EffectLibrary keeps it resident (sound is not None).
+    def __init__(self, path, pcm_cache):
+        self.path = path
+        self.pcm_cache = pcm_cache
+        self.name = os.path.basename(path)
+        self.nbytes = os.path.getsize(pcm_cache.ensure(path)) # The entry holds exactly the decoded samples
+        self.sound = None
+
+    def load(self):
+        return self.pcm_cache.load_sound(self.path)
+
+class EffectLibrary:
+    # Keeps recently played effects decoded within a byte budget and drops the
+    # least recently played ones when it overflows. An evicted effect is
+    # reloaded from its mapped cache file on the next key press, which is a
+    # copy out of the OS page cache rather than a decode. prefetch() fills
+    # whatever budget is free on a worker thread, without evicting anything.
+    def __init__(self, budget_bytes=EFFECT_MEMORY_BUDGET_BYTES):
+        self.budget_bytes = budget_bytes
+        self.resident_bytes = 0
+        self.hits = self.misses = self.evictions = self.prefetched = 0
+        self._resident = collections.OrderedDict() # EffectSample -> None, least recently played first
+        self._lock = threading.Lock()
+        self._prefetching = set()
+        self._retained = None # When set, only these effects may be prefetched
+        self._executor = None
+
+    def sound(self, effect):
+        # Plain Sounds (decoded without the PCM cache) are always resident.
+        if not isinstance(effect, EffectSample):
+            return effect
+        with self._lock:
+            if effect.sound is not None:
+                self.hits += 1
+                self._resident.move_to_end(effect)
+                return effect.sound
+            self.misses += 1
+        sound = effect.load()
+        with self._lock:
+            self._store(effect, sound, evict=True)
+            return effect.sound
+
+    def _store(self, effect, sound, evict):
+        # Called with the lock held. Returns whether the effect is resident afterwards.
+        if effect.sound is not None:
+            self._resident.move_to_end(effect)
+            return True
+        if not evict and self.resident_bytes + effect.nbytes > self.budget_bytes:
+            return False
+        effect.sound = sound
+        self._resident[effect] = None
+        self.resident_bytes += effect.nbytes
+        while self.resident_bytes > self.budget_bytes:
+            oldest = next(iter(self._resident))
+            if oldest is effect:
+                break # Larger than the whole budget on its own; keep it while it is in use
+            self._drop(oldest)
+            self.evictions += 1
+        return True
+
+    def _drop(self, effect):
+        del self._resident[effect]
+        self.resident_bytes -= effect.nbytes
+        effect.sound = None # A channel still playing it keeps its own reference
+
+    def forget(self, effect):
+        # The file changed or went away.
+        with self._lock:
+            if effect in self._resident:
+                self._drop(effect)
+
+    def retain(self, effects):
+        # Evicts every resident effect that is not in effects, e.g. the banks far from the active one.
+        with self._lock:
+            self._retained = set(effects)
+            for effect in [effect for effect in self._resident if effect not in self._retained]:
+                self._drop(effect)
+                self.evictions += 1
+
+    def prefetch(self, effects):
+        for effect in effects:
+            if isinstance(effect, EffectSample) and effect.sound is None and effect not in self._prefetching:
+                if self._executor is None:
+                    self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="effect-prefetch")
+                self._prefetching.add(effect)
+                self._executor.submit(self._prefetch, effect)
+
+    def _prefetch(self, effect):
+        try:
+            with self._lock:
+                wanted = self._retained is None or effect in self._retained
+                has_room = wanted and effect.sound is None and self.resident_bytes + effect.nbytes <= self.budget_bytes
+            if has_room:
+                sound = effect.load()
+                with self._lock:
+                    if effect.sound is None and self._store(effect, sound, evict=False):
+                        self.prefetched += 1
+        except (pygame.error, OSError, ValueError):
+            pass # Left for the key press to load, or report
+        finally:
+            self._prefetching.discard(effect)
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# --- Effect Voice Pool ---
+class EffectVoicePool:
+    # Pre-allocated mixer channels for sound effects. Each effect may hold at
+    # most max_voices_per_sound channels; when its cap or the whole pool is
+    # exhausted the oldest (or quietest) voice is stolen, where Sound.play()
+    # would silently drop the trigger.
+    def __init__(self, first_channel, channel_count, max_voices_per_sound=EFFECT_MAX_VOICES_PER_SOUND, stealing=EFFECT_VOICE_STEALING):
+        self.channels = [pygame.mixer.Channel(i) for i in range(first_channel, first_channel + channel_count)]
+        self.max_voices_per_sound = max_voices_per_sound
+        self.stealing = stealing
+        self.stolen_count = 0
+        self.last_latency_ms = None
+        self._voices = [None] * len(self.channels) # (sound, started_at, volume) per channel
+
+    def _victim(self, candidates):
+        if self.stealing == "quietest":
+            return min(candidates, key=lambda i: (self._voices[i][2], self._voices[i][1]))
+        return min(candidates, key=lambda i: self._voices[i][1])
+
+    def busy_count(self):
+        return sum(1 for channel in self.channels if channel.get_busy())
+
+    def play(self, sound, volume, triggered_at=None):
+        busy = [i for i, channel in enumerate(self.channels) if self._voices[i] and channel.get_busy()]
+        same_sound = [i for i in busy if self._voices[i][0] is sound]
+        if len(same_sound) >= self.max_voices_per_sound:
+            index = self._victim(same_sound)
+            self.stolen_count += 1
+        else:
+            busy_set = set(busy)
+            index = next((i for i in range(len(self.channels)) if i not in busy_set), None)
+            if index is None:
+                index = self._victim(busy)
+                self.stolen_count += 1
+
+        channel = self.channels[index]
+        channel.set_volume(volume) # Before play, so a stolen voice never restarts at the old level
+        channel.play(sound)
+        started_at = time.perf_counter()
+        self._voices[index] = (sound, started_at, volume)
+        if triggered_at is not None:
+            self.last_latency_ms = (started_at - triggered_at) * 1000
+        return channel
+
+    def fadeout(self, duration_ms):
+        for channel in self.channels:
+            if channel.get_busy():
+                channel.fadeout(duration_ms)
+
+def measure_trigger_latency(voice_pool, sound, trials=200, buffer_size=MIXER_BUFFER_SIZE):
+    # Posts key events and times each one from posting to Channel.play returning,
+    # through the same event queue the main loop reads. The mixer buffer adds
+    # its own latency on top; that part is reported separately.
+    samples = []
+    for _ in range(trials):
+        posted_at = time.perf_counter()
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_a))
+        for event in pygame.event.get(pygame.KEYDOWN):
+            voice_pool.play(sound, 1.0, posted_at)
+            samples.append(voice_pool.last_latency_ms)
+    samples.sort()
+    frequency = pygame.mixer.get_init()[0]
+    return {
+        "trials": len(samples),
+        "median_ms": samples[len(samples) // 2],
+        "p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+        "max_ms": samples[-1],
+        "mixer_buffer_ms": buffer_size / frequency * 1000,
     }
-    
-    # A fatal error only occurs if essential audio is missing.
-    is_fatal_error = 'music' in missing_asset_types or 'effects' in missing_asset_types
-    
-    return assets, is_fatal_error, missing_asset_types
+
+# --- Sound Banks ---
+class BankSelector:
+    # Pages a long list through a fixed set of keys: A-Z for effects, 1-0 for
+    # music. The list may grow or shrink while running.
+    def __init__(self, items, bank_size):
+        self.items = items
+        self.bank_size = bank_size
+        self.bank = 0
+
+    @property
+    def bank_count(self):
+        return max(1, math.ceil(len(self.items) / self.bank_size))
+
+    def index(self, slot):
+        # Position in the full list of the given key slot in the active bank, or None.
+        index = self.bank * self.bank_size + slot
+        return index if 0 <= slot < self.bank_size and index < len(self.items) else None
+
+    def bank_items(self, bank):
+        bank %= self.bank_count
+        return self.items[bank * self.bank_size:(bank + 1) * self.bank_size]
+
+    def nearby_items(self):
+        # The active bank first, then the next and the previous one (for prefetching in that order).
+        banks = dict.fromkeys([self.bank, (self.bank + 1) % self.bank_count, (self.bank - 1) % self.bank_count])
+        return [item for bank in banks for item in self.bank_items(bank)]
+
+    def step(self, delta):
+        self.bank = (self.bank + delta) % self.bank_count
+
+    def clamp(self):
+        self.bank = min(self.bank, self.bank_count - 1)
+
+    def label(self):
+        first = self.bank * self.bank_size + 1
+        last = min(len(self.items), first + self.bank_size - 1)
+        return f"{self.bank + 1}/{self.bank_count} ({first}-{last} of {len(self.items)})" if self.items else "-"
+
+# --- Session Recorder ---
+class SessionRecorder:
+    # Logs what the audio engine does (music changes, effect triggers, volume
+    # changes, stop-all) as timestamped JSON lines. The first line holds the
+    # mixer and engine settings render_session.py needs to mix the session
+    # again offline. Lines are flushed as they are written, so a crash loses
+    # nothing.
+    def __init__(self, path, settings):
+        self.path = path
+        self._file = open(path, "w", buffering=1)
+        self._lock = threading.Lock() # The playlist scheduler logs from its own thread
+        self._started = time.perf_counter()
+        self._write({"format": "auramixer-session", "version": 1, "started": time.time(), **settings})
+
+    def _write(self, record):
+        try:
+            with self._lock:
+                self._file.write(json.dumps(record) + "\n")
+        except (OSError, ValueError):
+            pass # Recording is best effort; never interrupt playback over it
+
+    def log(self, event, at=None, **fields):
+        # at: perf_counter time the event is heard, when that is not now.
+        self._write({"t": round((time.perf_counter() if at is None else at) - self._started, 6), "event": event, **fields})
+
+    def close(self):
+        self.log("end")
+        self._file.close()
+
+# --- Audio Engine ---
+class AudioEngine:
+    # Music crossfades between two reserved channels while effects go through the
+    # voice pool on the rest, decoded on demand by the effect library. Every
+    # trigger's latency (from its key event to Channel.play) is kept so the
+    # benchmarks can read it back.
+    def __init__(self, music_tracks, music_volume=0.5, effect_volume=0.7, library=None):
+        self.music_tracks = music_tracks
+        self.music_channels = (pygame.mixer.Channel(0), pygame.mixer.Channel(1))
+        self.voice_pool = EffectVoicePool(2, pygame.mixer.get_num_channels() - 2)
+        self.library = library or EffectLibrary()
+        self.music_volume, self.effect_volume = music_volume, effect_volume
+        self.current_music_index = None
+        self.music_streams = {} # Channel -> MusicStream currently feeding it
+        self.effect_latencies_ms = collections.deque(maxlen=1000)
+        self.music_latencies_ms = collections.deque(maxlen=1000)
+        self.recorder = None
+        self.playlist_mode = MUSIC_PLAYLIST_MODE
+        self.playlist_stats = PlaylistStats()
+        self.scheduler = None # The MusicScheduler playing, while music is in playlist mode
+        self.playlist_transitions = queue.SimpleQueue() # Heard transitions, handed from the scheduler thread to the main loop
+        self.wake_event = None # Event type posted when a transition is queued; set by the main loop
+        self._active_channel = self.music_channels[0]
+
+    def start_recording(self, path, pcm_cache_dir=None):
+        self.recorder = SessionRecorder(path, {
+            "mixer": list(get_mixer_format()), "pcm_cache": pcm_cache_dir,
+            "crossfade_ms": CROSSFADE_DURATION_MS, "effect_stop_fade_ms": EFFECT_STOP_FADE_MS,
+            "effect_channels": len(self.voice_pool.channels), "max_voices_per_sound": self.voice_pool.max_voices_per_sound,
+            "stealing": self.voice_pool.stealing, "music_volume": self.music_volume, "effect_volume": self.effect_volume,
+        })
+        return self.recorder
+
+    @property
+    def now_playing(self):
+        return self.music_tracks[self.current_music_index].name if self.current_music_index is not None else None
+
+    def play_music(self, track_index, triggered_at=None):
+        if track_index == self.current_music_index or not (0 <= track_index < len(self.music_tracks)):
+            return
+        self._start_music(track_index, triggered_at)
+
+    def _start_music(self, track_index, triggered_at):
+        if self.playlist_mode and self.scheduler and not self.scheduler.closing:
+            # Crossfades sample-accurately on a block boundary; current_music_index follows once apply_playlist_transitions sees it heard.
+            self.scheduler.play(self.music_tracks[track_index], triggered_at)
+            return
+        inactive_channel = self.music_channels[1] if self._active_channel is self.music_channels[0] else self.music_channels[0]
+
+        # Fade out the old track
+        if inactive_channel in self.music_streams:
+            self.music_streams[inactive_channel].fade_out(CROSSFADE_DURATION_MS)
+
+        # Stream the new track on the now-active channel with a fade-in
+        if self._active_channel in self.music_streams:
+            self.music_streams.pop(self._active_channel).stop()
+        if self.playlist_mode:
+            # The scheduler takes over from here; every later change goes through it.
+            self.scheduler = MusicScheduler(self.music_tracks, self.music_tracks[track_index], self._active_channel, self.music_volume,
+                                            fade_in_ms=CROSSFADE_DURATION_MS, triggered_at=triggered_at,
+                                            on_transition=self._on_playlist_transition, stats=self.playlist_stats)
+            self.music_streams[self._active_channel] = self.scheduler.start()
+        else:
+            on_started = None
+            if triggered_at is not None:
+                on_started = lambda started_at: self.music_latencies_ms.append((started_at - triggered_at) * 1000)
+            self.music_streams[self._active_channel] = MusicStream(
+                self.music_tracks[track_index], self._active_channel, self.music_volume,
+                fade_in_ms=CROSSFADE_DURATION_MS, loops=-1, on_started=on_started).start()
+            self.scheduler = None
+
+        # Swap channels for the next run
+        self._active_channel = inactive_channel
+        if not self.playlist_mode: # The scheduler reports its first track like any other transition
+            self.current_music_index = track_index
+            if self.recorder: self.recorder.log("music", path=self.music_tracks[track_index].path)
+
+    def _on_playlist_transition(self, scheduler, track, heard_at, triggered_at, crossfade_ms):
+        # Runs on the scheduler thread when a transition is queued; the main loop applies it.
+        self.playlist_transitions.put((scheduler, track, heard_at, triggered_at, crossfade_ms))
+        if self.wake_event is not None:
+            try:
+                pygame.event.post(pygame.event.Event(self.wake_event))
+            except pygame.error:
+                pass # Applied on the loop's next frame anyway
+
+    def apply_playlist_transitions(self):
+        # Called from the main loop, which owns music_tracks; heard_at is when the transition is (or will be) heard.
+        while True:
+            try:
+                scheduler, track, heard_at, triggered_at, crossfade_ms = self.playlist_transitions.get_nowait()
+            except queue.Empty:
+                break
+            if scheduler is self.scheduler and not scheduler.closing: # Music stopped since then keeps its index cleared
+                self.current_music_index = next((i for i, item in enumerate(self.music_tracks) if item is track), None)
+            if triggered_at is not None:
+                self.music_latencies_ms.append((heard_at - triggered_at) * 1000)
+            if self.recorder:
+                self.recorder.log("music", at=heard_at, path=track.path, curve="equal-power", crossfade_ms=crossfade_ms, loop=not self.playlist_mode)
+        if self.scheduler and self.scheduler.finished: # Faded out, or no track could be opened
+            self.scheduler, self.current_music_index = None, None
+
+    def music_tracks_changed(self):
+        # The main loop edited music_tracks in place (hot reload); the scheduler works from a copy.
+        if self.scheduler and not self.scheduler.closing:
+            self.scheduler.set_tracks(self.music_tracks)
+
+    def set_playlist_mode(self, enabled):
+        self.playlist_mode = enabled
+        if self.recorder: self.recorder.log("playlist", enabled=enabled)
+        if self.scheduler and not self.scheduler.closing:
+            self.scheduler.set_auto_advance(enabled) # Off: the current track loops, as in normal mode
+        elif enabled and self.current_music_index is not None:
+            # Hand the music over to the scheduler, carrying on with the next track.
+            self._start_music((self.current_music_index + 1) % len(self.music_tracks), None)
+
+    def set_music_volume(self, volume):
+        self.music_volume = volume
+        for stream in self.music_streams.values():
+            stream.set_volume(volume)
+        if self.recorder: self.recorder.log("music_volume", volume=volume)
+
+    def set_effect_volume(self, volume):
+        # Applies to the next effects played, like the mixer's per-channel volume.
+        self.effect_volume = volume
+        if self.recorder: self.recorder.log("effect_volume", volume=volume)
+
+    def play_effect(self, effect, triggered_at=None):
+        try:
+            sound = self.library.sound(effect)
+        except (pygame.error, OSError, ValueError):
+            return # The cache file went missing or is unreadable; the watcher will report the source
+        self.voice_pool.play(sound, self.effect_volume, triggered_at)
+        if triggered_at is not None:
+            self.effect_latencies_ms.append(self.voice_pool.last_latency_ms)
+        if self.recorder: self.recorder.log("effect", path=getattr(effect, "path", None), volume=self.effect_volume)
+
+    def stop_all(self):
+        for stream in self.music_streams.values():
+            stream.fade_out(CROSSFADE_DURATION_MS)
+        self.current_music_index = None
+        self.voice_pool.fadeout(EFFECT_STOP_FADE_MS)
+        if self.recorder: self.recorder.log("stop_all")
+
+    def close(self):
+        for stream in self.music_streams.values():
+            stream.stop()
+        for stream in self.music_streams.values():
+            stream.join(timeout=1.0) # Shutting down, so let the threads close their readers
+        self.library.close()
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+
+# --- Background Crossfade Engine ---
+FADE_EASINGS = {
+    "linear": lambda t: t,
+    "smoothstep": lambda t: t * t * (3 - 2 * t),
+    "sine": lambda t: 0.5 - math.cos(math.pi * t) / 2,
+}
+
+def blend_with_alpha(surface, current, target, weight):
+    current.set_alpha(None); surface.blit(current, (0, 0))
+    target.set_alpha(weight * 255 // 256); surface.blit(target, (0, 0))
+    target.set_alpha(None)
+
+def blend_with_numpy(surface, current, target, weight, band_rows=64):
+    # out = (current * (256 - w) + target * w) >> 8 over the raw bytes of 32-bit
+    # surfaces, row-major and in bands so the 16-bit scratch buffers stay small.
+    out, src, dst = (pygame.surfarray.pixels2d(s).T.view(numpy.uint8) for s in (surface, current, target))
+    height, row_bytes = out.shape
+    mixed, scratch = numpy.empty((band_rows, row_bytes), numpy.uint16), numpy.empty((band_rows, row_bytes), numpy.uint16)
+    for y in range(0, height, band_rows):
+        rows = slice(y, min(height, y + band_rows))
+        band, tmp = mixed[:rows.stop - y], scratch[:rows.stop - y]
+        numpy.multiply(src[rows], 256 - weight, out=band, dtype=numpy.uint16)
+        numpy.multiply(dst[rows], weight, out=tmp, dtype=numpy.uint16)
+        band += tmp
+        band >>= 8
+        out[rows] = band
+    del out, src, dst # Release the surface locks before the next blit
+
+BLEND_PATHS = {"alpha": blend_with_alpha, "numpy": blend_with_numpy}
+_chosen_blend_paths = {}
+
+def choose_blend_path(size, iterations=3):
+    # Times both blend paths on surfaces of the given size and keeps the faster one.
+    if numpy is None:
+        return "alpha"
+    if size not in _chosen_blend_paths:
+        make_surface = lambda: pygame.Surface(size).convert() if pygame.display.get_surface() else pygame.Surface(size)
+        surface, current, target = make_surface(), make_surface(), make_surface()
+        timings = {}
+        for name, blend in BLEND_PATHS.items():
+            try:
+                started = time.perf_counter()
+                for i in range(iterations):
+                    blend(surface, current, target, 64 + i)
+                timings[name] = time.perf_counter() - started
+            except (ValueError, pygame.error):
+                pass # Surface format the array path cannot address
+        _chosen_blend_paths[size] = min(timings, key=timings.get)
+    return _chosen_blend_paths[size]
+
+class BackgroundCrossfade:
+    # Crossfades two backgrounds as a function of elapsed time rather than frame
+    # count, so dropped frames shorten the fade's steps instead of stretching it.
+    # The cost of the last frame is kept for the perf monitor, so the blend path
+    # can be judged in use.
+    def __init__(self, duration_ms=BACKGROUND_FADE_MS, easing=BACKGROUND_FADE_EASING, blend_path="alpha"):
+        self.duration = max(1, duration_ms) / 1000
+        self.easing = FADE_EASINGS[easing]
+        self.blend_path = blend_path
+        self.last_cost_ms = 0.0
+        self.current = self.target = None
+        self._start_time = 0.0
+
+    @property
+    def active(self):
+        return self.target is not None
+
+    def start(self, current, target):
+        self.current, self.target = current, target
+        self._start_time = time.perf_counter()
+
+    def draw(self, surface):
+        # Draws the frame for the current time; returns True once the fade has completed.
+        started = time.perf_counter()
+        progress = min(1.0, (started - self._start_time) / self.duration)
+        if progress >= 1.0:
+            self.target.set_alpha(None); surface.blit(self.target, (0, 0))
+        else:
+            BLEND_PATHS[self.blend_path](surface, self.current, self.target, int(self.easing(progress) * 256))
+        self.last_cost_ms = (time.perf_counter() - started) * 1000
+        if progress >= 1.0:
+            self.current = self.target = None
+        return progress >= 1.0
+
+# --- Overlay Compositor ---
+class TextField:
+    # One line of text, rendered again only when its value changes.
+    def __init__(self, font, value, template="{}", color=(255, 255, 255)):
+        self.font, self.template, self.color = font, template, color
+        self.value, self.surface = None, None
+        self.update(value)
+
+    def update(self, value):
+        if self.surface is not None and value == self.value:
+            return False
+        self.value, self.surface = value, self.font.render(self.template.format(value), True, self.color)
+        return True
+
+class OverlayPanel:
+    # A translucent panel of text lines that is composited once and kept; only
+    # the lines whose value changed are re-rendered before it is rebuilt.
+    def __init__(self, fields, padding=25, centered=True, position=(0, 0)):
+        self.fields = fields
+        self.padding, self.centered, self.position = padding, centered, position
+        self.surface = None
+
+    def set(self, index, value):
+        if self.fields[index].update(value):
+            self.surface = None
+
+    def render(self):
+        if self.surface is None:
+            lines = [field.surface for field in self.fields]
+            width = max(line.get_width() for line in lines) + self.padding * 2
+            height = sum(line.get_height() for line in lines) + self.padding * 2
+            self.surface = pygame.Surface((width, height), pygame.SRCALPHA); self.surface.fill((0, 0, 0, 180))
+            current_y = self.padding
+            for line in lines:
+                x = (width - line.get_width()) // 2 if self.centered else self.padding
+                self.surface.blit(line, (x, current_y)); current_y += line.get_height()
+        return self.surface
+
+    def draw(self, surface):
+        panel = self.render()
+        if self.centered:
+            return surface.blit(panel, ((surface.get_width() - panel.get_width()) // 2, (surface.get_height() - panel.get_height()) // 2))
+        return surface.blit(panel, self.position)
+
+HELP_LINES = [
+    ("Auramixer Controls", "title"), ("", "text"),
+    ("--- General ---", "text"), ("SHIFT: Toggle this help", "text"), ("ESC: Quit Program", "text"), ("R: Reload (on media error screen)", "text"),
+    ("F5: Rescan Media Folders Now", "text"), ("F3: Toggle Performance Overlay", "text"), ("", "text"),
+    ("--- Audio Control ---", "text"), ("1-0 / Numpad 1-0: Play Music Track", "text"), ("A-Z: Play Sound Effect", "text"),
+    ("[ / ]: Previous/Next Effect Bank", "text"), ("- / =: Previous/Next Music Bank", "text"), ("F6: Toggle Playlist Mode (auto-advance)", "text"),
+    ("SPACE: Stop All Music & Effects", "text"), ("UP/DOWN Arrow: Adjust Music Volume", "text"), ("LEFT/RIGHT Arrow: Adjust Effect Volume", "text"),
+]
+
+class OverlayCompositor:
+    # The help panel and the volume/track HUD, composited over the background
+    # from cached surfaces so showing them costs a couple of blits per frame.
+    def __init__(self):
+        self._fonts = None
+        self.help_panel = self.hud_panel = self.perf_panel = None
+        self._hud_values = None
+
+    def _build(self):
+        self._fonts = {"title": pygame.font.Font(None, 52), "text": pygame.font.Font(None, 34), "small": pygame.font.Font(None, 26)}
+        self.help_panel = OverlayPanel([TextField(self._fonts[style], text) for text, style in HELP_LINES])
+        self.hud_panel = OverlayPanel([
+            TextField(self._fonts["text"], 0.0, "Music Volume: {:.0%}"),
+            TextField(self._fonts["text"], 0.0, "Effect Volume: {:.0%}"),
+            TextField(self._fonts["text"], "-", "Now Playing: {}"),
+            TextField(self._fonts["text"], "-", "Effect Bank: {}"),
+            TextField(self._fonts["text"], "-", "Music Bank: {}"),
+        ], padding=15, centered=False, position=(20, 20))
+        self.perf_panel = OverlayPanel([TextField(self._fonts["small"], "-") for _ in range(PerfMonitor.LINE_COUNT)], padding=10, centered=False)
+
+    def update_hud(self, music_volume, effect_volume, track_name, effect_bank="-", music_bank="-"):
+        # Returns True when something visible changed.
+        values = (music_volume, effect_volume, track_name or "-", effect_bank, music_bank)
+        if values == self._hud_values:
+            return False
+        if self._fonts is None:
+            self._build()
+        for index, value in enumerate(values):
+            self.hud_panel.set(index, value)
+        self._hud_values = values
+        return True
+
+    def update_perf(self, lines):
+        # Returns True when a line changed.
+        if self._fonts is None:
+            self._build()
+        changed = False
+        for index, line in enumerate(lines):
+            changed = self.perf_panel.fields[index].value != line or changed
+            self.perf_panel.set(index, line)
+        return changed
+
+    def draw(self, surface):
+        if self._fonts is None:
+            self._build()
+        return [self.help_panel.draw(surface), self.hud_panel.draw(surface)]
+
+    def draw_perf(self, surface):
+        # Top-right corner, out of the way of the help panel and the HUD.
+        if self._fonts is None:
+            self._build()
+        self.perf_panel.position = (surface.get_width() - self.perf_panel.render().get_width() - 20, 20)
+        return [self.perf_panel.draw(surface)]
+
+# --- Performance Instrumentation ---
+def sound_bytes(sound):
+    # Size of a decoded effect in the mixer format, without copying it out with get_raw().
+    frequency, size, channels = get_mixer_format()
+    return int(sound.get_length() * frequency) * abs(size) // 8 * channels
+
+class PerfMonitor:
+    # Main loop timings (frame, event handling, drawing, presenting) plus mixer
+    # and memory gauges, shown in the perf overlay and appended to a metrics
+    # file. With neither turned on it stays disabled and the loop skips every
+    # measurement, so the only cost is one attribute check per iteration.
+    LINE_COUNT = 8
+
+    def __init__(self, metrics_file=PERF_METRICS_FILE, dump_interval_ms=PERF_DUMP_INTERVAL_MS, histogram_edges_ms=PERF_HISTOGRAM_EDGES_MS, window=600):
+        self.metrics_file = metrics_file
+        self.dump_interval = dump_interval_ms / 1000
+        self.histogram_edges_ms = histogram_edges_ms
+        self.frame_histogram = [0] * (len(histogram_edges_ms) + 1) # Since startup
+        self.frame_ms = collections.deque(maxlen=window) # The most recent frames only
+        self.event_ms = collections.deque(maxlen=window)
+        self.draw_ms = collections.deque(maxlen=window)
+        self.present_ms = collections.deque(maxlen=window)
+        self.fade_ms = collections.deque(maxlen=window) # Blend cost of each background fade frame
+        self.gauges = {}
+        self.show_overlay = False
+        self.enabled = metrics_file is not None
+        self.next_sample_at = 0.0
+        self._next_dump_at = time.perf_counter() + self.dump_interval
+
+    def toggle_overlay(self):
+        self.show_overlay = not self.show_overlay
+        self.enabled = self.show_overlay or self.metrics_file is not None
+        self.next_sample_at = 0.0
+
+    def record_events(self, event_ms):
+        self.event_ms.append(event_ms)
+
+    def record_frame(self, frame_ms, draw_ms, present_ms):
+        self.frame_histogram[bisect.bisect(self.histogram_edges_ms, frame_ms)] += 1
+        self.frame_ms.append(frame_ms); self.draw_ms.append(draw_ms); self.present_ms.append(present_ms)
+
+    def record_fade(self, blend_ms):
+        self.fade_ms.append(blend_ms)
+
+    def sample(self, audio, slideshow, effect_sounds, loader=None, force_dump=False):
+        # Refreshes the gauges; called every PERF_SAMPLE_MS while enabled. Returns True when a dump was written.
+        now = time.perf_counter()
+        self.next_sample_at = now + PERF_SAMPLE_MS / 1000
+        load_times = sorted(loader.load_times_ms) if loader else []
+        latencies = sorted(audio.effect_latencies_ms)
+        self.gauges = {
+            "busy_channels": sum(1 for i in range(pygame.mixer.get_num_channels()) if pygame.mixer.Channel(i).get_busy()),
+            "channel_count": pygame.mixer.get_num_channels(),
+            "background_bytes": slideshow.resident_bytes,
+            "effect_bytes": audio.library.resident_bytes + sum(sound_bytes(effect) for effect in effect_sounds if isinstance(effect, pygame.mixer.Sound)),
+            "effect_hits": audio.library.hits,
+            "effect_misses": audio.library.misses,
+            "effect_evictions": audio.library.evictions,
+            "assets_loaded": len(load_times),
+            "load_median_ms": load_times[len(load_times) // 2] if load_times else 0.0,
+            "load_max_ms": load_times[-1] if load_times else 0.0,
+            "effect_latency_p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0.0,
+        }
+        if self.metrics_file and (force_dump or now >= self._next_dump_at):
+            self._next_dump_at = now + self.dump_interval
+            self.dump()
+            return True
+        return False
+
+    def snapshot(self):
+        frames, fades = sorted(self.frame_ms), sorted(self.fade_ms)
+        mean = lambda samples: sum(samples) / len(samples) if samples else 0.0
+        row = {
+            "time": round(time.time(), 3),
+            "frame_p50_ms": frames[len(frames) // 2] if frames else 0.0,
+            "frame_p99_ms": frames[min(len(frames) - 1, int(len(frames) * 0.99))] if frames else 0.0,
+            "frame_max_ms": frames[-1] if frames else 0.0,
+            "event_mean_ms": mean(self.event_ms),
+            "draw_mean_ms": mean(self.draw_ms),
+            "present_mean_ms": mean(self.present_ms),
+            "fade_p50_ms": fades[len(fades) // 2] if fades else 0.0,
+            "fade_max_ms": fades[-1] if fades else 0.0,
+            **self.gauges,
+        }
+        labels = [f"under_{edge:g}ms" for edge in self.histogram_edges_ms] + [f"over_{self.histogram_edges_ms[-1]:g}ms"]
+        row.update({f"frames_{label}": count for label, count in zip(labels, self.frame_histogram)})
+        return {key: round(value, 3) if isinstance(value, float) else value for key, value in row.items()}
+
+    def lines(self):
+        row = self.snapshot()
+        histogram = " ".join(f"<{edge:g}:{count}" for edge, count in zip(self.histogram_edges_ms, self.frame_histogram))
+        return [
+            f"Frame p50 {row['frame_p50_ms']:.1f} ms  p99 {row['frame_p99_ms']:.1f} ms  max {row['frame_max_ms']:.1f} ms",
+            f"Frames {histogram} {self.histogram_edges_ms[-1]:g}+:{self.frame_histogram[-1]}",
+            f"Events {row['event_mean_ms']:.2f} ms  Draw {row['draw_mean_ms']:.2f} ms  Present {row['present_mean_ms']:.2f} ms",
+            f"Background fade blend p50 {row['fade_p50_ms']:.2f} ms  max {row['fade_max_ms']:.2f} ms",
+            f"Mixer channels busy: {row.get('busy_channels', 0)}/{row.get('channel_count', 0)}  Effect latency p99 {row.get('effect_latency_p99_ms', 0.0):.1f} ms",
+            f"Decoded: backgrounds {row.get('background_bytes', 0) / 2**20:.1f} MB  effects {row.get('effect_bytes', 0) / 2**20:.1f} MB",
+            f"Effect memory: {row.get('effect_hits', 0)} hits  {row.get('effect_misses', 0)} misses  {row.get('effect_evictions', 0)} evicted",
+            f"Asset loads: {row.get('assets_loaded', 0)}  median {row.get('load_median_ms', 0.0):.1f} ms  max {row.get('load_max_ms', 0.0):.1f} ms",
+        ]
+
+    def dump(self):
+        row = self.snapshot()
+        try:
+            if self.metrics_file.lower().endswith(".csv"):
+                write_header = not os.path.exists(self.metrics_file) or os.path.getsize(self.metrics_file) == 0
+                with open(self.metrics_file, "a", newline="") as f:
+                    writer = csv.DictWriter(f, fieldnames=list(row))
+                    if write_header: writer.writeheader()
+                    writer.writerow(row)
+            else:
+                with open(self.metrics_file, "a") as f:
+                    f.write(json.dumps(row) + "\n")
+        except OSError:
+            pass # Metrics are best effort; never take the kiosk down over them
+
+# --- Asset Manifest ---
+# What each media file's header says: image dimensions, or audio sample rate,
+# channel count and duration. Only the first few kilobytes of a file are read
+# (and, for Ogg, its last page), so a thousand files are probed in
+# milliseconds. Files that are not in a format pygame can decode are rejected
+# here, before any decode is spent on them.
+PROBE_HEAD_BYTES = 65536
+JPEG_FRAME_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+WAV_CODECS = {1: "pcm", 2: "adpcm", 3: "float", 6: "alaw", 7: "mulaw", 0x11: "ima-adpcm", 0xFFFE: "extensible"}
+MP3_SAMPLE_RATES = (44100, 48000, 32000)
+MP3_BITRATES_KBPS = { # (MPEG-1, layer) -> kbit/s by bitrate index
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+def _probe_jpeg(f):
+    # Walks the marker segments up to the frame header; the EXIF block and thumbnails are skipped, not read.
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise ValueError("damaged JPEG marker")
+        kind = marker[1]
+        while kind == 0xFF: # Fill bytes
+            kind = f.read(1)[0]
+        if kind == 0x01 or 0xD0 <= kind <= 0xD8:
+            continue
+        if kind in (0xD9, 0xDA):
+            raise ValueError("JPEG has no frame header")
+        length = struct.unpack(">H", f.read(2))[0]
+        if kind in JPEG_FRAME_MARKERS:
+            height, width = struct.unpack(">xHH", f.read(5))
+            return {"format": "jpeg", "width": width, "height": height}
+        f.seek(length - 2, 1)
+
+def _probe_wav(f, file_size):
+    f.seek(12)
+    fmt = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            raise ValueError("WAV has no data chunk")
+        chunk_id, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        if chunk_id == b"fmt ":
+            fmt = struct.unpack("<HHIIHH", f.read(16))
+            f.seek(size - 16 + (size & 1), 1)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("WAV data comes before its format")
+            tag, channels, rate, byte_rate, _, bits = fmt
+            if tag not in WAV_CODECS:
+                raise ValueError(f"WAV codec 0x{tag:04x} is not supported")
+            data_size = min(size, file_size - f.tell()) # Streams written live often leave the size unset
+            return {"format": "wav", "codec": WAV_CODECS[tag], "rate": rate, "channels": channels, "bits": bits,
+                    "duration": data_size / byte_rate if byte_rate else None}
+        else:
+            f.seek(size + (size & 1), 1)
+
+def _probe_ogg(f, head, file_size):
+    packet = head[27 + head[26]:] # The first packet starts after the page's segment table
+    if packet.startswith(b"\x01vorbis"):
+        codec, channels, rate, pre_skip = "vorbis", packet[11], struct.unpack("<I", packet[12:16])[0], 0
+    elif packet.startswith(b"OpusHead"):
+        codec, channels, rate, pre_skip = "opus", packet[9], 48000, struct.unpack("<H", packet[10:12])[0]
+    else:
+        raise ValueError("Ogg stream is neither Vorbis nor Opus")
+    # The granule position of the last page counts the samples in the whole stream.
+    f.seek(max(0, file_size - PROBE_HEAD_BYTES))
+    tail = f.read()
+    last_page = tail.rfind(b"OggS")
+    granule = struct.unpack("<q", tail[last_page + 6:last_page + 14])[0] if 0 <= last_page <= len(tail) - 14 else -1
+    return {"format": "ogg", "codec": codec, "rate": rate, "channels": channels,
+            "duration": (granule - pre_skip) / rate if granule > 0 and rate else None}
+
+def _probe_flac(head):
+    if head[4] & 0x7F != 0:
+        raise ValueError("FLAC does not start with STREAMINFO")
+    info = int.from_bytes(head[18:26], "big") # Rate (20 bits), channels (3), bits (5), total samples (36)
+    rate, samples = info >> 44, info & (2**36 - 1)
+    return {"format": "flac", "rate": rate, "channels": ((info >> 41) & 7) + 1, "bits": ((info >> 36) & 31) + 1,
+            "duration": samples / rate if samples and rate else None}
+
+def _mp3_frame(header):
+    # (rate, channels, frame length, samples per frame, bitrate, MPEG-1) of a frame header, or None.
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version, layer_bits = (header[1] >> 3) & 3, (header[1] >> 1) & 3
+    bitrate_index, rate_index = header[2] >> 4, (header[2] >> 2) & 3
+    if version == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    mpeg1, layer = version == 3, 4 - layer_bits
+    rate = MP3_SAMPLE_RATES[rate_index] >> {3: 0, 2: 1, 0: 2}[version]
+    bitrate = MP3_BITRATES_KBPS[mpeg1, layer][bitrate_index] * 1000
+    padding = (header[2] >> 1) & 1
+    if layer == 1:
+        samples, length = 384, (12 * bitrate // rate + padding) * 4
+    else:
+        samples = 1152 if layer == 2 or mpeg1 else 576
+        length = samples // 8 * bitrate // rate + padding
+    return rate, 1 if header[3] >> 6 == 3 else 2, length, samples, bitrate, mpeg1
+
+def _probe_mp3(head, audio_start, file_size):
+    # The first frame header that is followed by another one (or by the end of
+    # what was read) is taken as the real start of the stream.
+    position = head.find(b"\xff")
+    while 0 <= position < len(head) - 4:
+        frame = _mp3_frame(head[position:position + 4])
+        if frame and (position + frame[2] >= len(head) - 4 or _mp3_frame(head[position + frame[2]:position + frame[2] + 4])):
+            break
+        position = head.find(b"\xff", position + 1)
+    else:
+        raise ValueError("no MPEG audio frame found")
+    rate, channels, _, samples, bitrate, mpeg1 = frame
+    # VBR files carry a frame count in a Xing/Info or VBRI header; anything else is constant bitrate.
+    xing = position + 4 + ((32 if channels == 2 else 17) if mpeg1 else (17 if channels == 2 else 9))
+    frames = None
+    if head[xing:xing + 4] in (b"Xing", b"Info") and struct.unpack(">I", head[xing + 4:xing + 8])[0] & 1:
+        frames = struct.unpack(">I", head[xing + 8:xing + 12])[0]
+    elif head[position + 36:position + 40] == b"VBRI":
+        frames = struct.unpack(">I", head[position + 50:position + 54])[0]
+    duration = frames * samples / rate if frames else (file_size - audio_start - position) * 8 / bitrate
+    return {"format": "mp3", "rate": rate, "channels": channels, "duration": duration}
+
+def probe_media_file(path):
+    # Returns {"kind": "image" or "audio", "format": ..., ...} from the file's
+    # header; raises ValueError for anything pygame could not decode.
+    with open(path, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        head = f.read(PROBE_HEAD_BYTES)
+        audio_start = 0
+        if head.startswith(b"ID3") and len(head) >= 10: # ID3v2 tags (cover art and all) are skipped by their syncsafe size
+            audio_start = 10 + sum(byte << (7 * (3 - i)) for i, byte in enumerate(head[6:10])) + (10 if head[5] & 0x10 else 0)
+            f.seek(audio_start)
+            head = f.read(PROBE_HEAD_BYTES)
+        if not head:
+            raise ValueError("file is empty")
+        try:
+            if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+                width, height = struct.unpack(">II", head[16:24])
+                info = {"kind": "image", "format": "png", "width": width, "height": height}
+            elif head[:6] in (b"GIF87a", b"GIF89a"):
+                width, height = struct.unpack("<HH", head[6:10])
+                info = {"kind": "image", "format": "gif", "width": width, "height": height}
+            elif head.startswith(b"BM"):
+                header_size = struct.unpack("<I", head[14:18])[0]
+                width, height = struct.unpack("<HH", head[18:22]) if header_size == 12 else struct.unpack("<ii", head[18:26])
+                info = {"kind": "image", "format": "bmp", "width": width, "height": abs(height)}
+            elif head.startswith(b"\xff\xd8"):
+                info = {"kind": "image", **_probe_jpeg(f)}
+            elif head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+                info = {"kind": "audio", **_probe_wav(f, file_size)}
+            elif head.startswith(b"OggS"):
+                info = {"kind": "audio", **_probe_ogg(f, head, file_size)}
+            elif head.startswith(b"fLaC"):
+                info = {"kind": "audio", **_probe_flac(head)}
+            elif audio_start or path.lower().endswith(".mp3"):
+                info = {"kind": "audio", **_probe_mp3(head, audio_start, file_size)}
+            else:
+                raise ValueError("not a supported image or audio format")
+        except (struct.error, IndexError):
+            raise ValueError("header is truncated") from None
+    if info["kind"] == "image" and not (info["width"] > 0 and info["height"] > 0):
+        raise ValueError("image has no pixels")
+    if info["kind"] == "audio" and not (info["rate"] > 0 and info["channels"] > 0):
+        raise ValueError("audio header has no sample rate or channels")
+    return info
+
+class AssetManifest:
+    # The probe results of every media file, persisted in .cache/manifest.json
+    # and keyed by mtime and size like the other caches, so a warm scan only
+    # stats the files. files() is the folder listing with rejected files left
+    # out; the loaders take it in place of list_asset_files.
+    VERSION = 1
+    KINDS = {"backgrounds": "image", "effects": "audio", "music": "audio"}
+    EXTENSIONS = {"backgrounds": VALID_BACKGROUND_EXT, "effects": VALID_AUDIO_EXT, "music": VALID_AUDIO_EXT}
+
+    def __init__(self, asset_paths):
+        self.asset_paths = asset_paths
+        self.path = get_cache_path(asset_paths, "manifest.json")
+        self.entries = self._read() # Path -> probe result plus "mtime_ns" and "size", or "error"
+        self.rejected = {} # Path -> why it was left out
+        self._dirty = False
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                manifest = json.load(f)
+            return manifest["files"] if manifest.get("version") == self.VERSION else {}
+        except (OSError, ValueError, KeyError, AttributeError):
+            return {}
+
+    def probe(self, path):
+        # Returns the file's entry, probing it only if it is new or changed. None
+        # means the file could not be opened right now; it is not judged then.
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        entry = self.entries.get(path)
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry
+        try:
+            entry = probe_media_file(path)
+        except ValueError as error:
+            entry = {"error": str(error)}
+        except OSError:
+            return None
+        self.entries[path] = entry = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, **entry}
+        self._dirty = True
+        return entry
+
+    def check(self, category, path):
+        # Returns the reason to reject the file, or None to load it.
+        entry = self.probe(path)
+        if entry is None:
+            reason = None
+        elif "error" in entry:
+            reason = entry["error"]
+        elif entry["kind"] != self.KINDS[category]:
+            reason = f"{entry['format']} {entry['kind']} in the {category} folder"
+        elif entry["kind"] == "image" and entry["width"] * entry["height"] > BACKGROUND_MAX_PIXELS:
+            reason = f"{entry['width']}x{entry['height']} image is too large to display"
+        else:
+            reason = None
+        if reason: self.rejected[path] = reason
+        else: self.rejected.pop(path, None)
+        return reason
+
+    def info(self, path):
+        entry = self.entries.get(path)
+        return entry if entry and "error" not in entry else None
+
+    def files(self, category):
+        return [path for path in list_asset_files(self.asset_paths[category], self.EXTENSIONS[category]) if self.check(category, path) is None]
+
+    def scan(self):
+        # Lists and checks every folder, forgets files that are gone and saves the manifest if anything changed.
+        self.rejected = {}
+        listed = {category: self.files(category) for category in ASSET_CATEGORIES}
+        seen = set(self.rejected).union(*listed.values())
+        for path in [path for path in self.entries if path not in seen]:
+            del self.entries[path]
+            self._dirty = True
+        self.save()
+        return listed
+
+    def forget(self, path):
+        self.rejected.pop(path, None)
+        if self.entries.pop(path, None) is not None:
+            self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump({"version": self.VERSION, "files": self.entries}, f)
+            os.replace(temp_path, self.path)
+            self._dirty = False
+        except OSError:
+            pass # A read-only media folder just means probing again next time
+
+# --- Asset Loading ---
+def decode_asset(category, path):
+    # Runs on a worker thread; pygame releases the GIL while SDL decodes.
+    if category == "backgrounds":
+        return pygame.image.load(path)
+    return pygame.mixer.Sound(path)
+
+def prepare_asset(category, path, background_cache=None, pcm_cache=None):
+    # Backgrounds are only validated here (warming their cache entry when there
+    # is one); the slideshow loads them when they come up.
+    if category == "backgrounds" and background_cache:
+        background_cache.prepare(path)
+        return path
+    if category == "effects" and pcm_cache:
+        return EffectSample(path, pcm_cache) # Decoded on demand by the EffectLibrary
+    result = decode_asset(category, path)
+    return path if category == "backgrounds" else result
+
+class AssetLoader:
+    # Decodes backgrounds and effects concurrently on a worker pool. Finished
+    # files are published into the asset lists from the main thread (poll) in
+    # folder order, so key mappings stay stable while the rest is still loading.
+    _PENDING, _FAILED = object(), object()
+
+    def __init__(self, asset_paths, screen_size=None, max_workers=ASSET_LOADER_WORKERS):
+        self.asset_paths = asset_paths
+        self.max_workers = max_workers
+        # With a known screen size backgrounds come pre-scaled, from the disk cache when warm.
+        self.background_cache = BackgroundCache(get_cache_path(asset_paths, "backgrounds"), screen_size) if screen_size else None
+        self.pcm_cache = PcmCache(get_cache_path(asset_paths, "audio"))
+        self.manifest = AssetManifest(asset_paths)
+        self.assets = {category: [] for category in ASSET_CATEGORIES}
+        self.sources = {category: [] for category in ASSET_CATEGORIES} # File path of each published asset
+        self.loaded_count, self.total_count, self.current_file = 0, 0, ""
+        self._files = {category: [] for category in ASSET_CATEGORIES}
+        self._slots = {category: [] for category in ASSET_CATEGORIES}
+        self._published = {category: 0 for category in ASSET_CATEGORIES}
+        self._results = queue.SimpleQueue()
+        self._executor = None
+        self._effect_cache = None
+        self._finished = False
+        self.load_times_ms = [] # Time each background or effect took to prepare, in completion order
+
+    def start(self):
+        # Files whose header is damaged or unsupported are left out before any decoding starts.
+        listed = self.manifest.scan()
+        background_files, effect_files, music_files = listed["backgrounds"], listed["effects"], listed["music"]
+        self.total_count = len(background_files) + len(effect_files) + len(music_files)
+        self._files = {"backgrounds": background_files, "effects": effect_files, "music": music_files}
+
+        # Music is streamed while it plays, so tracks are ready as soon as they are listed.
+        self._slots["music"] = [MusicTrack(path, self.pcm_cache, self.manifest.info(path)) for path in music_files]
+        self._advance("music")
+
+        # Cache entries are in the mixer's format, so audio only goes through the
+        # cache once the mixer is open. Missing entries are converted in separate
+        # processes: the first effect, then the rest shortest first so most keys
+        # work soonest, then any music that cannot be streamed as is.
+        if pygame.mixer.get_init():
+            self._effect_cache = self.pcm_cache
+            mixer_format = get_mixer_format()
+            duration = lambda path: (self.manifest.info(path) or {}).get("duration") or 0
+            conversions = effect_files[:1] + sorted(effect_files[1:], key=duration)
+            conversions += sorted((track.path for track in self._slots["music"] if track.needs_conversion(mixer_format)), key=duration)
+            for path in conversions:
+                try:
+                    if self.pcm_cache.missing(path):
+                        self.pcm_cache.submit(path, duration(path))
+                except OSError:
+                    pass # Unreadable files fail again, and are reported, when they are loaded
+
+        jobs = [("backgrounds", i, path) for i, path in enumerate(background_files)]
+        jobs += [("effects", i, path) for i, path in enumerate(effect_files)]
+        self._slots["backgrounds"] = [self._PENDING] * len(background_files)
+        self._slots["effects"] = [self._PENDING] * len(effect_files)
+        # The first file of each category goes to the front so playback can start early.
+        jobs.sort(key=lambda job: job[1] != 0)
+        if jobs:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="asset-loader")
+            for job in jobs:
+                self._executor.submit(self._decode, *job)
+        return self
+
+    def _decode(self, category, index, path):
+        started = time.perf_counter()
+        try:
+            result = prepare_asset(category, path, self.background_cache, self._effect_cache)
+        except (pygame.error, OSError):
+            result = None
+        self._results.put((category, index, path, result, (time.perf_counter() - started) * 1000))
+
+    def _advance(self, category):
+        slots, assets = self._slots[category], self.assets[category]
+        while self._published[category] < len(slots) and slots[self._published[category]] is not self._PENDING:
+            value = slots[self._published[category]]
+            if value is not self._FAILED:
+                assets.append(value)
+                self.sources[category].append(self._files[category][self._published[category]])
+            self.loaded_count += 1
+            self._published[category] += 1
+
+    def poll(self, max_items=None, block=False):
+        # Publishes finished files; runs on the main thread so the lists never change under it.
+        handled = 0
+        while max_items is None or handled < max_items:
+            try:
+                category, index, path, result, load_ms = self._results.get(block=block and handled == 0)
+            except queue.Empty:
+                break
+            self.load_times_ms.append(load_ms)
+            self._slots[category][index] = self._FAILED if result is None else result
+            self.current_file = os.path.basename(path)
+            self._advance(category)
+            handled += 1
+        if self.done and not self._finished:
+            self._finished = True
+            if self.background_cache:
+                self.background_cache.evict_stale()
+            if self._effect_cache:
+                self.pcm_cache.evict_stale()
+            if self._executor:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            self.pcm_cache.release_converters() # Music still queued keeps converting in the background
+        return handled
+
+    def load_first_background(self):
+        try:
+            source = self.assets["backgrounds"][0]
+            if self.background_cache:
+                return self.background_cache.load(source).convert()
+            return pygame.image.load(source).convert()
+        except (pygame.error, OSError):
+            return None
+
+    def _exhausted(self, category):
+        return self._published[category] == len(self._slots[category])
+
+    @property
+    def done(self):
+        return all(self._exhausted(category) for category in ASSET_CATEGORIES)
+
+    def is_playable(self):
+        # Playback can start once every category has a first asset or is known to be empty.
+        return all(self.assets[category] or self._exhausted(category) for category in ASSET_CATEGORIES)
+
+    def progress(self):
+        return self.loaded_count, self.total_count
+
+    def status(self):
+        missing_asset_types = [category for category in ASSET_CATEGORIES if not self.assets[category] and self._exhausted(category)]
+        # A fatal error only occurs if essential audio is missing.
+        is_fatal_error = 'music' in missing_asset_types or 'effects' in missing_asset_types
+        return is_fatal_error, missing_asset_types
+
+    def wait(self):
+        while not self._finished:
+            self.poll(block=not self.done)
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self.pcm_cache.cancel_pending()
+        self.pcm_cache.release_converters(cancel=True)
+
+class AssetIndex:
+    # Path -> (mtime, size) of every media file, refreshed with os.scandir so
+    # finding what changed costs one directory read per folder.
+    EXTENSIONS = {"backgrounds": VALID_BACKGROUND_EXT, "effects": VALID_AUDIO_EXT, "music": VALID_AUDIO_EXT}
+
+    def __init__(self, asset_paths):
+        self.asset_paths = asset_paths
+        self.entries = {category: self.scan_folder(category) for category in ASSET_CATEGORIES}
+
+    def scan_folder(self, category):
+        entries = {}
+        try:
+            with os.scandir(self.asset_paths[category]) as folder:
+                for entry in folder:
+                    if entry.name.lower().endswith(self.EXTENSIONS[category]) and entry.is_file():
+                        stat = entry.stat()
+                        entries[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            pass
+        return entries
+
+    def refresh(self):
+        # Returns (category, path, kind) for every file "added", "removed" or "changed" since the last scan.
+        changes = []
+        for category in ASSET_CATEGORIES:
+            old_entries, new_entries = self.entries[category], self.scan_folder(category)
+            changes += [(category, path, "removed") for path in old_entries if path not in new_entries]
+            changes += [(category, path, "changed" if path in old_entries else "added")
+                        for path, signature in new_entries.items() if old_entries.get(path) != signature]
+            self.entries[category] = new_entries
+        return changes
+
+class AssetWatcher:
+    # Decodes only the files an AssetIndex refresh reports. poll() hands back
+    # (category, path, asset) updates for the main thread to apply in place;
+    # an asset of None means the file is gone or no longer decodes. Changed
+    # audio is converted on the PCM cache's process pools, as at startup.
+    def __init__(self, asset_paths, background_cache=None, pcm_cache=None, manifest=None, max_workers=ASSET_LOADER_WORKERS):
+        self.index = AssetIndex(asset_paths)
+        self.background_cache = background_cache
+        self.manifest = manifest
+        self.pcm_cache = pcm_cache or PcmCache(get_cache_path(asset_paths, "audio"))
+        self.max_workers = max_workers
+        self._results = queue.SimpleQueue()
+        self._pending = 0
+        self._executor = None
+
+    def check(self):
+        changes = self.index.refresh()
+        converting = False
+        for category, path, kind in changes:
+            self._pending += 1
+            if kind == "removed":
+                if self.manifest: self.manifest.forget(path)
+                self._results.put((category, path, None))
+                continue
+            if self.manifest and self.manifest.check(category, path):
+                self._results.put((category, path, None)) # Rejected from its header, like at startup
+                continue
+            info = self.manifest.info(path) if self.manifest else None
+            if category != "backgrounds" and pygame.mixer.get_init():
+                converting = self._convert(category, path, info) or converting
+            if category == "music":
+                self._results.put((category, path, MusicTrack(path, self.pcm_cache, info)))
+            else:
+                if self._executor is None:
+                    self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="asset-watcher")
+                self._executor.submit(self._decode, category, path)
+        if converting: self.pcm_cache.release_converters() # The queued conversions still finish
+        if changes and self.manifest: self.manifest.save()
+        return len(changes)
+
+    def _convert(self, category, path, info):
+        # Queues the PCM cache entry an effect, or music that cannot be streamed as is, will load.
+        try:
+            if category == "music" and not MusicTrack(path, self.pcm_cache, info).needs_conversion(get_mixer_format()):
+                return False
+            if not self.pcm_cache.missing(path):
+                return False
+            self.pcm_cache.submit(path, (info or {}).get("duration") or 0)
+            return True
+        except OSError:
+            return False # Reported when the file is loaded
+
+    def _decode(self, category, path):
+        try:
+            result = prepare_asset(category, path, self.background_cache, self.pcm_cache if pygame.mixer.get_init() else None)
+        except (pygame.error, OSError):
+            result = None
+        self._results.put((category, path, result))
+
+    @property
+    def busy(self):
+        return self._pending > 0
+
+    def poll(self):
+        updates = []
+        while True:
+            try:
+                updates.append(self._results.get_nowait())
+            except queue.Empty:
+                break
+        self._pending -= len(updates)
+        return updates
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+def load_all_assets(asset_paths, screen_size=None):
+    # Blocking variant of AssetLoader for callers that need everything up front.
+    loader = AssetLoader(asset_paths, screen_size).start()
+    loader.wait()
+    is_fatal_error, missing_asset_types = loader.status()
+    return loader.assets, is_fatal_error, missing_asset_types
+
+def show_loading_screen(screen, loader):
+    screen_width, screen_height = screen.get_size()
+    font = pygame.font.Font(None, 36)
+    bar_width = screen_width // 2
+    bar_rect = pygame.Rect((screen_width - bar_width) // 2, screen_height // 2, bar_width, 12)
+    clock = pygame.time.Clock()
+    backdrop = None
+    while not loader.is_playable():
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                loader.close()
+                return False
+        loader.poll()
+        loaded, total = loader.progress()
+        # Show the first background as soon as it is ready, under the progress bar.
+        if backdrop is None and loader.assets["backgrounds"]:
+            backdrop = loader.load_first_background()
+        if backdrop: screen.blit(backdrop, (0, 0))
+        else: screen.fill((0, 0, 0))
+        pygame.draw.rect(screen, (90, 90, 90), bar_rect, 1)
+        if total:
+            pygame.draw.rect(screen, (255, 255, 255), (bar_rect.x, bar_rect.y, bar_rect.width * loaded // total, bar_rect.height))
+        label = font.render(f"Loading {loader.current_file} ({loaded}/{total})", True, (255, 255, 255))
+        screen.blit(label, label.get_rect(center=(screen_width // 2, bar_rect.top - 30)))
+        pygame.display.flip()
+        clock.tick(30)
+    return True
 
 def show_media_error_screen(screen, asset_paths, is_portable):
     base_path = asset_paths['base']
     location_string = f"the folders next to the application.\n\nPath: {base_path}" if is_portable else f"the 'Auramixer' folder in your Documents.\n\nPath: {base_path}"
-    root = tk.Tk()
-    root.withdraw()
-    messagebox.showwarning(
-        "Auramixer - Essential Files Missing", 
+    show_dialog(
+        "showwarning", "Auramixer - Essential Files Missing",
         f"Essential audio files are missing from the 'music' or 'effects' folders. Please add audio files to {location_string}\n\nThen press [R] to reload."
     )
-    root.destroy()
 
     screen_width, screen_height = screen.get_size()
     error_font = pygame.font.Font(None, 48)
@@ -182,158 +2559,321 @@ def show_media_error_screen(screen, asset_paths, is_portable):
         pygame.time.wait(100)
     return False
 
-def run_main_program(screen, assets):
-    all_background_images = assets["backgrounds"]
+def run_main_program(screen, assets, loader=None, audio=None, frame_hook=None, perf=None, control=None):
+    background_sources = assets["backgrounds"]
     effect_sounds = assets["effects"]
-    music_sounds = assets["music"]
+    music_tracks = assets["music"]
 
     SCREEN_WIDTH, SCREEN_HEIGHT = screen.get_size()
     show_text = False
 
-    def scale_and_crop_image(img):
-        img_aspect, screen_aspect = img.get_width() / img.get_height(), SCREEN_WIDTH / SCREEN_HEIGHT
-        new_width, new_height = (int(SCREEN_HEIGHT * img_aspect), SCREEN_HEIGHT) if img_aspect > screen_aspect else (SCREEN_WIDTH, int(SCREEN_WIDTH / img_aspect))
-        scaled = pygame.transform.scale(img, (new_width, new_height))
-        x_offset, y_offset = (new_width - SCREEN_WIDTH) // 2, (new_height - SCREEN_HEIGHT) // 2
-        return scaled.subsurface(pygame.Rect(x_offset, y_offset, SCREEN_WIDTH, SCREEN_HEIGHT))
-
-    scaled_backgrounds = [scale_and_crop_image(img) for img in all_background_images]
-    current_bg_index, current_display_image, target_display_image, fade_alpha = 0, scaled_backgrounds[0], None, 255
+    slideshow = Slideshow(background_sources, (SCREEN_WIDTH, SCREEN_HEIGHT), loader.background_cache if loader else None)
+    slideshow.pin(0)
+    current_bg_index, current_display_image, target_display_image = 0, slideshow.load_now(0), None
+    blend_path = choose_blend_path(screen.get_size()) if BACKGROUND_FADE_BLEND == "auto" else BACKGROUND_FADE_BLEND
+    crossfade = BackgroundCrossfade(BACKGROUND_FADE_MS, BACKGROUND_FADE_EASING, blend_path)
+    slideshow.prefetch_after(0)
+    background_change_pending = False
     BACKGROUND_CHANGE_EVENT = pygame.USEREVENT + 1
-    pygame.time.set_timer(BACKGROUND_CHANGE_EVENT, 10000)
+    pygame.time.set_timer(BACKGROUND_CHANGE_EVENT, BACKGROUND_CHANGE_MS)
 
     # --- Advanced Audio Engine for Crossfading ---
-    effect_map = {pygame.K_a + i: sound for i, sound in enumerate(effect_sounds)}
-    music_volume, effect_volume = 0.5, 0.7
-
-    # Reserve two channels for music crossfading
-    music_channel1 = pygame.mixer.Channel(0)
-    music_channel2 = pygame.mixer.Channel(1)
-    active_music_channel = music_channel1
-    current_music_index = None
-
-    def play_music(track_index):
-        nonlocal active_music_channel, current_music_index
-        if track_index == current_music_index or not (0 <= track_index < len(music_sounds)):
+    audio = audio or AudioEngine(music_tracks)
+    if SESSION_LOG_DIR and audio.recorder is None:
+        try:
+            os.makedirs(SESSION_LOG_DIR, exist_ok=True)
+            audio.start_recording(os.path.join(SESSION_LOG_DIR, time.strftime("session-%Y%m%d-%H%M%S.jsonl")),
+                                  loader.pcm_cache.cache_dir if loader else None)
+        except OSError:
+            pass # Play on without a recording
+
+    # --- Sound Banks ---
+    # A-Z and 1-0 play from the active effect and music bank. Only the active
+    # effect bank and its neighbours stay decoded; the next bank is prefetched
+    # so switching to it is instant. Music is streamed and needs nothing kept.
+    effect_banks = BankSelector(effect_sounds, 26)
+    music_banks = BankSelector(music_tracks, 10)
+
+    def refresh_effect_banks():
+        nearby = effect_banks.nearby_items()
+        audio.library.retain(nearby)
+        audio.library.prefetch(nearby)
+    refresh_effect_banks()
+
+    def play_effect(slot, triggered_at):
+        index = effect_banks.index(slot)
+        if index is not None: audio.play_effect(effect_sounds[index], triggered_at)
+
+    def play_music(slot, triggered_at):
+        index = music_banks.index(slot)
+        if index is not None: audio.play_music(index, triggered_at)
+
+    # Pick up files the loader finished since the last frame.
+    def absorb_loaded_assets():
+        if loader is None or loader.done:
             return
+        known_effects = len(effect_sounds)
+        loader.poll(max_items=2)
+        if len(effect_sounds) != known_effects: refresh_effect_banks()
 
-        inactive_music_channel = music_channel2 if active_music_channel == music_channel1 else music_channel1
-        
-        # Fade out the old track
-        if inactive_music_channel.get_sound():
-            inactive_music_channel.fadeout(CROSSFADE_DURATION_MS)
+    # --- Hot Reload ---
+    # Files added, changed or removed while running are applied to the live
+    # lists in place; playback and the slideshow carry on untouched.
+    watcher = AssetWatcher(loader.asset_paths, loader.background_cache, loader.pcm_cache, loader.manifest) if loader else None
+    ASSET_SCAN_EVENT = pygame.USEREVENT + 2
+    if watcher: pygame.time.set_timer(ASSET_SCAN_EVENT, HOT_RELOAD_POLL_MS)
 
-        # Play new track on the now-active channel with a fade-in
-        sound_to_play = music_sounds[track_index]
-        active_music_channel.play(sound_to_play, loops=-1, fade_ms=CROSSFADE_DURATION_MS)
-        active_music_channel.set_volume(music_volume)
-        
-        # Swap channels for the next run
-        current_music_index = track_index
-        active_music_channel = inactive_music_channel
-
-    def stop_all_sounds():
-        nonlocal current_music_index
-        music_channel1.fadeout(CROSSFADE_DURATION_MS)
-        music_channel2.fadeout(CROSSFADE_DURATION_MS)
-        current_music_index = None
-
-        # Fade out all other active channels (sound effects)
-        for i in range(2, pygame.mixer.get_num_channels()):
-            channel = pygame.mixer.Channel(i)
-            if channel.get_busy():
-                channel.fadeout(1000) # Fade out effects over 1 second
-
-    def play_effect(key_code):
-        if key_code in effect_map:
-            effect_map[key_code].set_volume(effect_volume)
-            effect_map[key_code].play()
-
-    # --- Help Screen ---
-    def draw_help_screen(surface):
-        # (Help screen drawing code remains the same)
-        title_font, text_font, white = pygame.font.Font(None, 52), pygame.font.Font(None, 34), (255, 255, 255)
-        help_items = [("Auramixer Controls", title_font),("", text_font),("--- General ---", text_font),("SHIFT: Toggle this help", text_font),("ESC: Quit Program", text_font),("R: Reload (on media error screen)", text_font),("", text_font),("--- Audio Control ---", text_font),("1-0 / Numpad 1-0: Play Music Track", text_font),("A-Z: Play Sound Effect", text_font),("SPACE: Stop All Music & Effects", text_font),("UP/DOWN Arrow: Adjust Music Volume", text_font),("LEFT/RIGHT Arrow: Adjust Effect Volume", text_font)]
-        rendered_lines = [font.render(text, True, white) for text, font in help_items]
-        padding, max_width, total_height = 25, max(line.get_width() for line in rendered_lines), sum(line.get_height() for line in rendered_lines)
-        panel_width, panel_height = max_width + padding * 2, total_height + padding * 2
-        panel = pygame.Surface((panel_width, panel_height), pygame.SRCALPHA); panel.fill((0, 0, 0, 180))
-        current_y = padding
-        for line in rendered_lines:
-            panel.blit(line, ((panel_width - line.get_width()) // 2, current_y)); current_y += line.get_height()
-        surface.blit(panel, ((surface.get_width() - panel_width) // 2, (surface.get_height() - panel_height) // 2))
+    # --- Remote Control ---
+    # Batches from the control socket run in the frame they arrive in; the
+    # wake-up event cuts the idle wait short. Every command of a batch runs,
+    # and the batch is answered with the ones that could not.
+    CONTROL_EVENT = pygame.USEREVENT + 3
+    if control: control.wake_event = CONTROL_EVENT
+
+    # Playlist transitions are queued by the scheduler thread and applied here
+    # (now playing, latency, session log), so music_tracks is only ever touched
+    # by this loop; the event wakes it for them.
+    PLAYLIST_EVENT = pygame.USEREVENT + 4
+    audio.wake_event = PLAYLIST_EVENT
+
+    def find_asset(category, items, key):
+        # A number counts across all banks from 1; a name matches the file name with or without its extension.
+        if isinstance(key, int):
+            return key - 1 if 1 <= key <= len(items) else None
+        paths = loader.sources[category] if loader else [getattr(item, "path", None) for item in items]
+        key = key.lower()
+        return next((i for i, path in enumerate(paths) if path and key in (os.path.basename(path).lower(), os.path.splitext(os.path.basename(path))[0].lower())), None)
+
+    def run_control_command(command, argument, triggered_at):
+        # Returns why the command could not run, or None.
+        nonlocal running
+        if command == "effect":
+            index = find_asset("effects", effect_sounds, argument)
+            if index is None: return f"no effect '{argument}'"
+            audio.play_effect(effect_sounds[index], triggered_at)
+        elif command == "music":
+            index = find_asset("music", music_tracks, argument)
+            if index is None: return f"no music track '{argument}'"
+            audio.play_music(index, triggered_at)
+        elif command == "stop": audio.stop_all()
+        elif command == "music-volume": audio.set_music_volume(argument)
+        elif command == "effect-volume": audio.set_effect_volume(argument)
+        elif command == "effect-bank":
+            effect_banks.step(argument)
+            refresh_effect_banks()
+        elif command == "music-bank": music_banks.step(argument)
+        elif command == "playlist": audio.set_playlist_mode(argument)
+        elif command == "rescan":
+            if not (watcher and loader.done): return "rescan is unavailable until the media has loaded"
+            watcher.check()
+        elif command == "quit": running = False
+        return None
+
+    def apply_asset_updates(updates):
+        nonlocal current_bg_index
+        current_track_path = music_tracks[audio.current_music_index].path if audio.current_music_index is not None else None
+        current_background = background_sources[current_bg_index] if background_sources else None
+        for category, path, asset in updates:
+            items, paths = loader.assets[category], loader.sources[category]
+            if category == "backgrounds":
+                slideshow.forget(path)
+                if asset is not None and None in paths: # Real images replace the fallback background
+                    fallback_position = paths.index(None)
+                    del items[fallback_position], paths[fallback_position]
+            if path in paths:
+                position = paths.index(path)
+                if category == "effects": audio.library.forget(items[position])
+                if asset is None: del items[position], paths[position]
+                else: items[position] = asset
+            elif asset is not None:
+                items.append(asset); paths.append(path)
+
+        effect_banks.clamp(); music_banks.clamp()
+        refresh_effect_banks()
+        audio.music_tracks_changed()
+        audio.current_music_index = next((i for i, track in enumerate(music_tracks) if track.path == current_track_path), None)
+        if current_background in background_sources: current_bg_index = background_sources.index(current_background)
+        else: current_bg_index = max(0, min(current_bg_index, len(background_sources) - 1))
 
     # --- Main Loop ---
+    # Frames are only presented while the picture changes (a fade, or the
+    # overlay being toggled or updated). Otherwise the loop sleeps in
+    # pygame.event.wait, which still wakes immediately for key presses and timer events.
     running = True
     clock = pygame.time.Clock()
+    screen_rect = screen.get_rect()
+    overlay = OverlayCompositor()
+    perf = perf or PerfMonitor()
+    dirty_rects, overlay_rects, overlay_dirty = [screen_rect], [], False
+
+    def draw_overlays():
+        return (overlay.draw(screen) if show_text else []) + (overlay.draw_perf(screen) if perf.show_overlay else [])
+
     while running:
-        for event in pygame.event.get():
+        absorb_loaded_assets()
+        if target_display_image or dirty_rects:
+            events = pygame.event.get()
+        else:
+            keep_polling = background_change_pending or (loader is not None and not loader.done) or (watcher is not None and watcher.busy)
+            first_event = pygame.event.wait(ACTIVE_POLL_MS if keep_polling else IDLE_WAIT_MS)
+            events = [first_event] + pygame.event.get() if first_event.type != pygame.NOEVENT else []
+        events_received_at = time.perf_counter()
+        for event in events:
+            # Events posted by another thread may carry the time they were triggered.
+            triggered_at = getattr(event, "triggered_at", events_received_at)
             if event.type == pygame.QUIT: running = False
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED): dirty_rects.append(screen_rect)
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE: running = False
-                elif event.key == pygame.K_SPACE: stop_all_sounds()
-                elif event.key in (pygame.K_LSHIFT, pygame.K_RSHIFT): show_text = not show_text
-                elif pygame.K_a <= event.key <= pygame.K_z: play_effect(event.key)
-                elif pygame.K_1 <= event.key <= pygame.K_9: play_music(event.key - pygame.K_1)
-                elif event.key == pygame.K_0: play_music(9)
-                elif pygame.K_KP1 <= event.key <= pygame.K_KP9: play_music(event.key - pygame.K_KP1)
-                elif event.key == pygame.K_KP0: play_music(9)
-                elif event.key == pygame.K_UP:
-                    music_volume = min(1.0, round(music_volume + 0.1, 1))
-                    music_channel1.set_volume(music_volume); music_channel2.set_volume(music_volume)
-                elif event.key == pygame.K_DOWN:
-                    music_volume = max(0.0, round(music_volume - 0.1, 1))
-                    music_channel1.set_volume(music_volume); music_channel2.set_volume(music_volume)
-                elif event.key == pygame.K_RIGHT: effect_volume = min(1.0, round(effect_volume + 0.1, 1))
-                elif event.key == pygame.K_LEFT: effect_volume = max(0.0, round(effect_volume - 0.1, 1))
+                elif event.key == pygame.K_SPACE: audio.stop_all()
+                elif event.key in (pygame.K_LSHIFT, pygame.K_RSHIFT): show_text, overlay_dirty = not show_text, True
+                elif event.key == pygame.K_F3: perf.toggle_overlay(); overlay_dirty = True
+                elif event.key == pygame.K_F6: audio.set_playlist_mode(not audio.playlist_mode)
+                elif event.key == pygame.K_F5 and watcher and loader.done: watcher.check()
+                elif pygame.K_a <= event.key <= pygame.K_z: play_effect(event.key - pygame.K_a, triggered_at)
+                elif pygame.K_1 <= event.key <= pygame.K_9: play_music(event.key - pygame.K_1, triggered_at)
+                elif event.key == pygame.K_0: play_music(9, triggered_at)
+                elif pygame.K_KP1 <= event.key <= pygame.K_KP9: play_music(event.key - pygame.K_KP1, triggered_at)
+                elif event.key == pygame.K_KP0: play_music(9, triggered_at)
+                elif event.key in (pygame.K_LEFTBRACKET, pygame.K_RIGHTBRACKET):
+                    effect_banks.step(1 if event.key == pygame.K_RIGHTBRACKET else -1)
+                    refresh_effect_banks()
+                elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS): music_banks.step(-1)
+                elif event.key in (pygame.K_EQUALS, pygame.K_KP_PLUS): music_banks.step(1)
+                elif event.key == pygame.K_UP: audio.set_music_volume(min(1.0, round(audio.music_volume + 0.1, 1)))
+                elif event.key == pygame.K_DOWN: audio.set_music_volume(max(0.0, round(audio.music_volume - 0.1, 1)))
+                elif event.key == pygame.K_RIGHT: audio.set_effect_volume(min(1.0, round(audio.effect_volume + 0.1, 1)))
+                elif event.key == pygame.K_LEFT: audio.set_effect_volume(max(0.0, round(audio.effect_volume - 0.1, 1)))
             
-            if event.type == BACKGROUND_CHANGE_EVENT:
-                current_bg_index = (current_bg_index + 1) % len(scaled_backgrounds)
-                target_display_image = scaled_backgrounds[current_bg_index]
-                fade_alpha = 0
+            if event.type == BACKGROUND_CHANGE_EVENT: background_change_pending = bool(background_sources)
+            if event.type == ASSET_SCAN_EVENT and loader.done: watcher.check()
 
-        # Drawing
-        if target_display_image and fade_alpha < 255:
-            fade_alpha = min(255, fade_alpha + 5)
-            current_display_image.set_alpha(255 - fade_alpha); screen.blit(current_display_image, (0, 0))
-            target_display_image.set_alpha(fade_alpha); screen.blit(target_display_image, (0, 0))
-            if fade_alpha >= 255: current_display_image = target_display_image; target_display_image = None
-        else:
-            screen.blit(current_display_image, (0, 0))
+        if control:
+            for commands, triggered_at, reply in control.drain():
+                errors = [error for error in (run_control_command(command, argument, triggered_at) for command, argument in commands) if error]
+                control.reply(reply, "error: " + "; ".join(errors) if errors else "ok")
+        audio.apply_playlist_transitions()
 
-        if show_text: draw_help_screen(screen)
+        if watcher and watcher.busy:
+            updates = watcher.poll()
+            if updates: apply_asset_updates(updates)
 
-        pygame.display.flip()
-        clock.tick(60)
+        # Start the fade only once the next image is ready; until then keep showing the current one.
+        slideshow.poll()
+        if background_change_pending and not target_display_image and background_sources:
+            next_bg_index = (current_bg_index + 1) % len(background_sources)
+            next_image = slideshow.get(next_bg_index) if next_bg_index != current_bg_index else None
+            if next_image:
+                slideshow.pin(current_bg_index, next_bg_index)
+                current_bg_index, target_display_image = next_bg_index, next_image
+                crossfade.start(current_display_image, target_display_image)
+                slideshow.prefetch_after(current_bg_index)
+            background_change_pending = next_image is None and next_bg_index != current_bg_index
 
-def main():
-    setup_single_instance_lock()
+        track_name = f"{audio.now_playing} (playlist)" if audio.playlist_mode and audio.now_playing else audio.now_playing
+        if overlay.update_hud(audio.music_volume, audio.effect_volume, track_name, effect_banks.label(), music_banks.label()) and show_text: overlay_dirty = True
 
-    pygame.mixer.pre_init(44100, -16, 2, 512)
-    pygame.init()
-    pygame.mixer.set_num_channels(32) # More channels for effects
-    
+        if perf.enabled:
+            events_handled_at = time.perf_counter()
+            if events: perf.record_events((events_handled_at - events_received_at) * 1000)
+            if events_handled_at >= perf.next_sample_at:
+                perf.sample(audio, slideshow, effect_sounds, loader)
+                if perf.show_overlay and overlay.update_perf(perf.lines()): overlay_dirty = True
+
+        # Drawing
+        fading = target_display_image is not None
+        overlays_shown = show_text or perf.show_overlay
+        if fading:
+            if crossfade.draw(screen):
+                current_display_image, target_display_image = target_display_image, None
+                slideshow.pin(current_bg_index)
+            if perf.enabled: perf.record_fade(crossfade.last_cost_ms)
+            if overlays_shown: overlay_rects = draw_overlays()
+            dirty_rects = [screen_rect]
+        elif dirty_rects or overlay_dirty:
+            # Restore the background under the panels before drawing them again, so their alpha never stacks.
+            if overlay_dirty or overlays_shown: dirty_rects += overlay_rects
+            for rect in dirty_rects: screen.blit(current_display_image, rect, rect)
+            overlay_rects = draw_overlays()
+            dirty_rects += overlay_rects
+
+        if dirty_rects:
+            if perf.enabled: drawn_at = time.perf_counter()
+            pygame.display.update(dirty_rects)
+            if perf.enabled:
+                presented_at = time.perf_counter()
+                perf.record_frame((presented_at - events_received_at) * 1000, (drawn_at - events_handled_at) * 1000, (presented_at - drawn_at) * 1000)
+            if frame_hook: frame_hook((time.perf_counter() - events_received_at) * 1000, fading)
+        dirty_rects, overlay_dirty = [], False
+        if fading: clock.tick(60)
+
+    if control:
+        control.wake_event = None # Later lines are queued for the next run of the loop
+    audio.wake_event = None
+    if loader:
+        loader.close()
+    if watcher:
+        watcher.close()
+    if perf.metrics_file:
+        perf.sample(audio, slideshow, effect_sounds, loader, force_dump=True)
+    slideshow.close()
+    audio.close()
+
+# --- Startup ---
+# Only the pygame subsystems Auramixer uses are started (not pygame.init(), which
+# also brings up joysticks and the rest), and the window comes first so
+# something is on screen before the audio device opens.
+def init_display(size=(0, 0), flags=pygame.FULLSCREEN):
+    pygame.display.init()
     pygame.display.set_caption("Auramixer")
     try:
         icon_surface = pygame.image.load(get_resource_path("assets/icon_64.png"))
         pygame.display.set_icon(icon_surface)
     except Exception: pass
-        
-    screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+
+    screen = pygame.display.set_mode(size, flags)
     screen.fill((0, 0, 0)); pygame.display.flip()
+    return screen
+
+def init_audio():
+    pygame.mixer.pre_init(44100, -16, 2, MIXER_BUFFER_SIZE)
+    pygame.mixer.init()
+    pygame.mixer.set_num_channels(MIXER_NUM_CHANNELS) # More channels for effects
+    pygame.mixer.set_reserved(2) # Keep the two music channels away from effects
+    pygame.font.init()
+
+def main():
+    # Arguments form a control command for an instance that is already running,
+    # e.g. `auramixer effect 3` or `auramixer "music rain; music-volume 0.6"`.
+    command = " ".join(arg for arg in sys.argv[1:] if not arg.startswith("-psn_")) # macOS adds a -psn_ argument to app launches
+    try:
+        parse_control_commands(command)
+    except ValueError as error:
+        print(f"Auramixer: {error}", file=sys.stderr)
+        sys.exit(2)
+    control = setup_single_instance_lock(command)
+    if control and command: # Nothing was running to forward to; run the command once playback starts
+        control.commands.put((parse_control_commands(command), None, None))
+
+    screen = init_display()
+    init_audio()
 
     asset_paths, needs_notification = setup_asset_paths(IS_PORTABLE)
 
     if needs_notification:
-        root = tk.Tk(); root.withdraw()
-        messagebox.showinfo("Auramixer Setup", f"A new folder has been created for your media files at:\n\n{asset_paths['base']}\n\nPlease add your files to the subfolders.")
-        root.destroy()
+        show_dialog("showinfo", "Auramixer Setup", f"A new folder has been created for your media files at:\n\n{asset_paths['base']}\n\nPlease add your files to the subfolders.")
 
     while True:
-        assets, is_fatal_error, missing_types = load_all_assets(asset_paths)
+        # Start as soon as every category has its first asset; the rest keeps loading.
+        loader = AssetLoader(asset_paths, screen.get_size()).start()
+        if not show_loading_screen(screen, loader):
+            break
+        assets = loader.assets
+        is_fatal_error, missing_types = loader.status()
         
         # Handle fatal error (missing audio)
         if is_fatal_error:
+            loader.close()
             if not show_media_error_screen(screen, asset_paths, IS_PORTABLE): 
                 break # Quit if user chooses not to reload
             else:
@@ -341,9 +2881,7 @@ def main():
 
         # Handle non-fatal warning (missing backgrounds)
         if 'backgrounds' in missing_types:
-            root = tk.Tk(); root.withdraw()
-            messagebox.showinfo("Auramixer - Backgrounds Missing", f"No images found in the 'backgrounds' folder. Using the default icon as a fallback.\n\nTo see your own images, add them to:\n{asset_paths['backgrounds']}")
-            root.destroy()
+            show_dialog("showinfo", "Auramixer - Backgrounds Missing", f"No images found in the 'backgrounds' folder. Using the default icon as a fallback.\n\nTo see your own images, add them to:\n{asset_paths['backgrounds']}")
             
             # Add the fallback background programmatically
             try:
@@ -352,13 +2890,15 @@ def main():
             except Exception:
                 black_surface = pygame.Surface((800, 600)); black_surface.fill((0, 0, 0))
                 assets['backgrounds'].append(black_surface)
+            loader.sources['backgrounds'].append(None) # No file behind the fallback
 
         # If we reach here, we are good to go
-        run_main_program(screen, assets)
+        run_main_program(screen, assets, loader, control=control)
         break # Exit the while loop after the program finishes normally
 
     pygame.quit()
     sys.exit()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support() # The PCM converter processes of a frozen build start here
     main()
@@ -0,0 +1,245 @@
+"""Benchmarks Auramixer's loading, crossfade frame times and trigger latency.
+
+Everything runs under SDL's dummy video and audio drivers on a generated media
+tree (or your own with --assets), so it works on a CI machine. Each phase runs
+in a fresh interpreter so peak memory is measured per phase:
+
+  load     load_all_assets wall time and peak RSS, once with an empty cache
+           (cold) and once reusing it (warm), and the time to rescan the
+           asset manifest
+  run      run_main_program with a short background interval, recording the
+           time spent on every crossfade frame and on its blend alone, while a second thread presses
+           effect and music keys and the time from each key press to
+           Channel.play is recorded; with --playlist the music runs through
+           the playlist scheduler and its transition jitter and underruns are
+           reported, and --stall-ms makes every crossfade frame that much
+           slower to show they do not depend on the render loop
+
+The report is JSON. Pass a previous report as --baseline and any timing or
+memory figure that got worse by more than --tolerance fails the run:
+
+    python benchmark_auramixer.py --images 500 --tracks 200 --output bench.json
+    python benchmark_auramixer.py --images 500 --tracks 200 --baseline bench.json
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from measure_startup import make_synthetic_assets
+
+FADE_GAP_MS = 250 # Crossfade frames further apart than this belong to separate fades
+
+def asset_paths_for(base_path):
+    return {"base": base_path, **{folder: os.path.join(base_path, folder) for folder in ("backgrounds", "effects", "music")}}
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS; Windows has no resource module.
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def summarize(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {"count": 0}
+    rank = lambda fraction: samples[min(len(samples) - 1, int(len(samples) * fraction))]
+    return {"count": len(samples), "median_ms": rank(0.5), "p95_ms": rank(0.95), "p99_ms": rank(0.99), "max_ms": samples[-1]}
+
+def child_load(base_path, screen_size):
+    import auramixer
+    auramixer.init_display(screen_size, 0)
+    auramixer.init_audio()
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    assets, is_fatal_error, _ = auramixer.load_all_assets(asset_paths_for(base_path), screen_size)
+    load_ms = (time.perf_counter() - started) * 1000
+    # A second scan finds the manifest warm and only stats the files.
+    started = time.perf_counter()
+    manifest = auramixer.AssetManifest(asset_paths_for(base_path))
+    manifest.scan()
+    report = {
+        "load_all_assets_ms": load_ms,
+        "manifest_rescan_ms": (time.perf_counter() - started) * 1000,
+        "rejected_files": len(manifest.rejected),
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_before_load_mb": rss_before,
+        "counts": {category: len(items) for category, items in assets.items()},
+        "fatal": is_fatal_error,
+    }
+    auramixer.pygame.quit()
+    return report
+
+def press_keys(auramixer, effect_count, track_count, presses, interval_s):
+    # Every fifth press switches the music track; the rest trigger effects.
+    pygame = auramixer.pygame
+    time.sleep(1.0) # Let the loop settle first
+    for i in range(presses):
+        if i % 5 == 4 and track_count:
+            key = pygame.K_1 + (i // 5) % min(9, track_count)
+        else:
+            key = pygame.K_a + i % max(1, min(26, effect_count))
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=key, triggered_at=time.perf_counter()))
+        time.sleep(interval_s)
+    time.sleep(0.5) # Give the last music stream time to start
+    pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+def child_run(base_path, screen_size, presses, background_change_ms, effect_budget_mb=None, playlist=False, stall_ms=0):
+    import auramixer
+    auramixer.BACKGROUND_CHANGE_MS = background_change_ms
+    screen = auramixer.init_display(screen_size, 0)
+    auramixer.init_audio()
+    loader = auramixer.AssetLoader(asset_paths_for(base_path), screen_size).start()
+    loader.wait()
+    assets = loader.assets
+    library = auramixer.EffectLibrary(int(effect_budget_mb * 2**20)) if effect_budget_mb else None
+    audio = auramixer.AudioEngine(assets["music"], library=library)
+    audio.playlist_mode = playlist
+
+    frames = [] # (presented_at, work_ms) for every crossfade frame
+    def frame_hook(work_ms, fading):
+        if fading: frames.append((time.perf_counter(), work_ms))
+        if fading and stall_ms:
+            stall_until = time.perf_counter() + stall_ms / 1000
+            while time.perf_counter() < stall_until: # Busy, like a slow frame, rather than sleeping
+                pass
+
+    # The perf monitor measures each fade frame's blend on its own, as the overlay shows it.
+    perf = auramixer.PerfMonitor(metrics_file=None, window=100000)
+    perf.enabled = True
+
+    presser = threading.Thread(target=press_keys, args=(auramixer, len(assets["effects"]), len(assets["music"]), presses, 0.1), daemon=True)
+    presser.start()
+    auramixer.run_main_program(screen, assets, loader, audio, frame_hook, perf)
+    presser.join()
+
+    intervals = [(b[0] - a[0]) * 1000 for a, b in zip(frames, frames[1:])]
+    report = {
+        "crossfade_frame_work": summarize([work_ms for _, work_ms in frames]),
+        "crossfade_blend": summarize(list(perf.fade_ms)),
+        # Includes the 60 fps pacing; the gaps between two separate fades are left out.
+        "crossfade_frame_interval": summarize([interval for interval in intervals if interval < FADE_GAP_MS]),
+        "effect_trigger_latency": summarize(audio.effect_latencies_ms),
+        "music_trigger_latency": summarize(audio.music_latencies_ms),
+        # How far playlist transitions were heard from their scheduled sample, either way.
+        "music_transition_jitter": summarize([abs(jitter) for jitter in audio.playlist_stats.transition_jitter_ms]),
+        "music_transitions": audio.playlist_stats.transitions,
+        "music_underruns": audio.playlist_stats.underruns,
+        "effect_voices_stolen": audio.voice_pool.stolen_count,
+        "effect_memory": {"hits": audio.library.hits, "misses": audio.library.misses, "evictions": audio.library.evictions,
+                          "prefetched": audio.library.prefetched, "resident_mb": audio.library.resident_bytes / 2**20},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    auramixer.pygame.quit()
+    return report
+
+def run_child(phase, base_path, args):
+    environment = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy", PYGAME_HIDE_SUPPORT_PROMPT="1")
+    command = [sys.executable, os.path.abspath(__file__), "--child", phase, base_path,
+               "--screen", args.screen, "--presses", str(args.presses), "--background-change-ms", str(args.background_change_ms)]
+    if args.effect_budget_mb:
+        command += ["--effect-budget-mb", str(args.effect_budget_mb)]
+    if args.playlist:
+        command += ["--playlist"]
+    if args.stall_ms:
+        command += ["--stall-ms", str(args.stall_ms)]
+    output = subprocess.run(command, cwd=os.path.dirname(os.path.abspath(__file__)), env=environment,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def flatten(report, prefix=""):
+    # Timing and memory figures only, keyed by their path in the report.
+    values = {}
+    for key, value in report.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and key.endswith(("_ms", "_mb")):
+            values[prefix + key] = value
+    return values
+
+def find_regressions(report, baseline, tolerance):
+    current, previous = flatten(report), flatten(baseline)
+    regressions = []
+    for name, old_value in previous.items():
+        new_value = current.get(name)
+        if new_value is not None and old_value > 0 and new_value > old_value * (1 + tolerance):
+            regressions.append({"metric": name, "baseline": old_value, "current": new_value, "change": new_value / old_value - 1})
+    return regressions
+
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Auramixer loading, crossfade frame times and trigger latency.")
+    parser.add_argument("--images", type=int, default=500, help="backgrounds in the generated tree")
+    parser.add_argument("--effects", type=int, default=26, help="effects in the generated tree")
+    parser.add_argument("--tracks", type=int, default=200, help="music tracks in the generated tree")
+    parser.add_argument("--image-size", default="1920x1080", help="size of the generated backgrounds")
+    parser.add_argument("--image-format", default="jpg", choices=("png", "jpg", "bmp"), help="file type of the generated backgrounds")
+    parser.add_argument("--track-seconds", type=float, default=3.0, help="length of each generated track")
+    parser.add_argument("--assets", help="benchmark this media folder instead of a generated one (its .cache folder is cleared for the cold load)")
+    parser.add_argument("--screen", default="1920x1080", help="window size for loading and the main loop")
+    parser.add_argument("--presses", type=int, default=100, help="key presses during the main loop run")
+    parser.add_argument("--background-change-ms", type=int, default=1500, help="background interval during the main loop run")
+    parser.add_argument("--effect-budget-mb", type=float, help="decoded-effect memory budget during the main loop run (default: the app's)")
+    parser.add_argument("--playlist", action="store_true", help="play music in playlist mode during the main loop run")
+    parser.add_argument("--stall-ms", type=float, default=0, help="extra busy time added to every crossfade frame during the main loop run")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline (0.25 = 25%%)")
+    parser.add_argument("--child", nargs=2, metavar=("PHASE", "ASSETS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        phase, base_path = args.child
+        if phase == "load":
+            report = child_load(base_path, parse_size(args.screen))
+        else:
+            report = child_run(base_path, parse_size(args.screen), args.presses, args.background_change_ms, args.effect_budget_mb,
+                               args.playlist, args.stall_ms)
+        print(json.dumps(report))
+        return 0
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        base_path = args.assets
+        if not base_path:
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+            os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+            base_path = make_synthetic_assets(temp_dir, images=args.images, effects=args.effects, tracks=args.tracks,
+                                              image_size=parse_size(args.image_size), track_seconds=args.track_seconds,
+                                              image_format=args.image_format)["base"]
+        shutil.rmtree(os.path.join(base_path, ".cache"), ignore_errors=True)
+        report = {
+            "config": {key: getattr(args, key) for key in ("images", "effects", "tracks", "image_size", "image_format", "track_seconds", "screen", "presses", "background_change_ms", "effect_budget_mb", "playlist", "stall_ms")},
+            "load_cold": run_child("load", base_path, args),
+            "load_warm": run_child("load", base_path, args),
+            "run": run_child("run", base_path, args),
+        }
+        if args.assets:
+            report["config"]["assets"] = args.assets
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = find_regressions(report, json.load(f), args.tolerance)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+    for regression in report.get("regressions", []):
+        print(f"REGRESSION: {regression['metric']} {regression['current']:.1f} vs {regression['baseline']:.1f} (+{regression['change']:.0%})", file=sys.stderr)
+    return 1 if report.get("regressions") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
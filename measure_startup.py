@@ -0,0 +1,127 @@
+"""Measures how long Auramixer takes to import and to start up.
+
+Every run is a fresh interpreter using SDL's dummy video and audio drivers, so
+this works on a CI machine without a screen or sound card. The first run starts
+with an empty cache (cold start); the rest reuse it (warm start). Results are
+printed as JSON, and the thresholds turn a slow start into a failing exit code.
+
+    python measure_startup.py --runs 5 --max-import-ms 500 --max-playable-ms 1500
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+PHASES = ("import_ms", "first_frame_ms", "audio_ready_ms", "playable_ms", "first_background_ms")
+
+def make_synthetic_assets(base_path, images=5, effects=5, tracks=3, image_size=(1920, 1080), effect_seconds=0.5, track_seconds=5.0, image_format="png"):
+    # Writes a media tree with the same layout as the real one: PNG (or JPEG/BMP)
+    # backgrounds and 44.1 kHz 16-bit stereo WAV effects and music.
+    import pygame
+    asset_paths = {"base": base_path}
+    for folder in ("backgrounds", "effects", "music"):
+        asset_paths[folder] = os.path.join(base_path, folder)
+        os.makedirs(asset_paths[folder], exist_ok=True)
+
+    for i in range(images):
+        surface = pygame.Surface(image_size)
+        surface.fill(((i * 37) % 256, (i * 91) % 256, (i * 53) % 256))
+        pygame.draw.circle(surface, (255, 255, 255), (image_size[0] // 2, image_size[1] // 2), min(image_size) // 4)
+        pygame.image.save(surface, os.path.join(asset_paths["backgrounds"], f"background_{i:04d}.{image_format}"))
+
+    for folder, count, seconds in (("effects", effects, effect_seconds), ("music", tracks, track_seconds)):
+        for i in range(count):
+            with wave.open(os.path.join(asset_paths[folder], f"{folder}_{i:04d}.wav"), "wb") as wav_file:
+                wav_file.setnchannels(2); wav_file.setsampwidth(2); wav_file.setframerate(44100)
+                frame = (i + 1).to_bytes(2, "little", signed=True) * 2
+                wav_file.writeframes(frame * int(44100 * seconds))
+    return asset_paths
+
+def run_child(base_path):
+    # Runs inside the measured interpreter; times are relative to the import starting.
+    started = time.perf_counter()
+    elapsed_ms = lambda: (time.perf_counter() - started) * 1000
+    import auramixer
+    timings = {"import_ms": elapsed_ms(), "tkinter_imported": "tkinter" in sys.modules}
+
+    screen = auramixer.init_display((1280, 720), 0)
+    timings["first_frame_ms"] = elapsed_ms()
+    auramixer.init_audio()
+    timings["audio_ready_ms"] = elapsed_ms()
+
+    asset_paths = {"base": base_path, **{folder: os.path.join(base_path, folder) for folder in ("backgrounds", "effects", "music")}}
+    loader = auramixer.AssetLoader(asset_paths, screen.get_size()).start()
+    while not loader.is_playable():
+        loader.poll(block=True)
+    timings["playable_ms"] = elapsed_ms()
+    if loader.load_first_background():
+        timings["first_background_ms"] = elapsed_ms()
+    loader.close()
+    auramixer.pygame.quit()
+    print(json.dumps(timings))
+
+def measure(base_path, runs):
+    shutil.rmtree(os.path.join(base_path, ".cache"), ignore_errors=True)
+    environment = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy", PYGAME_HIDE_SUPPORT_PROMPT="1")
+    project_dir = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", base_path],
+                                cwd=project_dir, env=environment, capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    warm_runs = results[1:] or results
+    return {
+        "runs": runs,
+        "cold": results[0],
+        "warm_median": {phase: statistics.median(run[phase] for run in warm_runs) for phase in PHASES if all(phase in run for run in warm_runs)},
+        "tkinter_imported": any(run["tkinter_imported"] for run in results),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure Auramixer import and startup times.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to start (the first one is cold)")
+    parser.add_argument("--assets", help="media folder to load instead of a generated one (its .cache folder is cleared for the cold run)")
+    parser.add_argument("--max-import-ms", type=float, help="fail if the warm median import time is above this")
+    parser.add_argument("--max-first-frame-ms", type=float, help="fail if the warm median time to the first frame is above this")
+    parser.add_argument("--max-playable-ms", type=float, help="fail if the warm median time until playback can start is above this")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--child", metavar="ASSETS", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child)
+        return 0
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        base_path = args.assets
+        if not base_path:
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+            os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+            base_path = make_synthetic_assets(temp_dir)["base"]
+        report = measure(base_path, max(1, args.runs))
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+    failures = []
+    if report["tkinter_imported"]:
+        failures.append("tkinter was imported during startup")
+    for limit, phase in ((args.max_import_ms, "import_ms"), (args.max_first_frame_ms, "first_frame_ms"), (args.max_playable_ms, "playable_ms")):
+        if limit is not None and report["warm_median"].get(phase, float("inf")) > limit:
+            failures.append(f"{phase} {report['warm_median'].get(phase, float('inf')):.1f} > {limit:.1f}")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
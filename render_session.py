@@ -0,0 +1,229 @@
+"""Mixes a recorded Auramixer session into a WAV file, offline.
+
+Start Auramixer with AURAMIXER_SESSION_DIR set and each session's music
+changes, effect triggers, volume changes and stop-alls are logged there. This
+script replays such a log through a NumPy mixer that follows the player's
+rules: a new track fades in while the previous one fades out over
+CROSSFADE_DURATION_MS, music loops (or, in playlist mode, crossfades into the
+next track with the scheduler's equal-power curves), effects share a voice pool with the same
+polyphony cap and voice stealing, and stop-all fades effects out over
+EFFECT_STOP_FADE_MS. Audio comes from the PCM cache (converted first where it
+is missing) with SDL's dummy audio driver, so no sound card is needed, and the
+mix runs many times faster than real time.
+
+    python render_session.py sessions/session-20261017-201500.jsonl session.wav
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import wave
+
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import auramixer
+
+BLOCK_SECONDS = 10 # Length of audio mixed and written at a time
+
+class Voice:
+    # One sound on one mixer channel: the frames it starts and stops at and a
+    # piecewise-linear gain envelope for its fades (sampled frame by frame for
+    # the playlist's equal-power curves). Music loops until stopped and follows
+    # the session's music volume; an effect keeps the volume it was triggered
+    # with.
+    def __init__(self, samples, start, volume=None, loop=False, fade_in=0, path=None, curve=None):
+        self.samples, self.start, self.volume, self.loop, self.path = samples, start, volume, loop, path
+        self.end = None if loop else start + len(samples)
+        if fade_in and curve:
+            self.gain_times, self.gain_values = list(range(start - 1, start + fade_in + 1)), list(auramixer.fade_envelope(fade_in, "in"))
+        else:
+            self.gain_times, self.gain_values = ([start, start + fade_in], [0.0, 1.0]) if fade_in else ([start], [1.0])
+
+    def active_at(self, frame):
+        return self.start <= frame and (self.end is None or frame < self.end)
+
+    def fade_out(self, frame, frames, curve=None):
+        # Like MusicStream.fade_out and Channel.fadeout: from the current gain down to silence.
+        if frames <= 0:
+            return self.stop(frame)
+        gain = float(numpy.interp(frame, self.gain_times, self.gain_values))
+        earlier = [i for i, point in enumerate(self.gain_times) if point < frame - 1]
+        self.gain_times = [self.gain_times[i] for i in earlier]
+        self.gain_values = [self.gain_values[i] for i in earlier]
+        if curve:
+            self.gain_times += range(frame - 1, frame + frames + 1)
+            self.gain_values += [gain * value for value in auramixer.fade_envelope(frames, curve)]
+        else:
+            self.gain_times += [frame, frame + frames]
+            self.gain_values += [gain, 0.0]
+        self.stop(frame + frames)
+
+    def end_of_pass(self, frame):
+        # First frame from `frame` on where a looping voice wraps around.
+        length = len(self.samples)
+        return self.start + -(-(frame - self.start) // length) * length
+
+    def stop(self, frame):
+        self.end = frame if self.end is None else min(self.end, frame)
+
+def read_session(path):
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if not records or records[0].get("format") != "auramixer-session":
+        raise ValueError(f"{path} is not an Auramixer session log")
+    # Playlist transitions are logged when they are scheduled, with the (later) time they are heard.
+    return records[0], sorted(records[1:], key=lambda record: record["t"])
+
+def build_timeline(header, events, load):
+    # Replays the log against the same channel logic as AudioEngine and
+    # EffectVoicePool. Returns the voices, the music volume as a step function
+    # and the frame the session ended at.
+    rate = header["mixer"][0]
+    to_frames = lambda seconds: int(round(seconds * rate))
+    crossfade = to_frames(header["crossfade_ms"] / 1000)
+    effect_fade = to_frames(header["effect_stop_fade_ms"] / 1000)
+    victim = (lambda voices: min(voices, key=lambda v: (v.volume, v.start))) if header["stealing"] == "quietest" else (lambda voices: min(voices, key=lambda v: v.start))
+
+    voices, effects = [], []
+    music_slots, active_slot = [[], []], 0 # The voices on each of the two music channels
+    playlist_voice = None # The track the playlist scheduler is playing
+    volume_times, volume_values = [0], [header["music_volume"]]
+    end_frame = None
+    for event in events:
+        frame, kind = to_frames(event["t"]), event["event"]
+        music_slots = [[voice for voice in slot if voice.end is None or voice.end > frame] for slot in music_slots]
+        if kind == "music" and event.get("curve") == "equal-power":
+            # A playlist transition: everything still playing fades out while the
+            # track fades in on the scheduler's channel, the one AudioEngine.play_music
+            # started it on before swapping slots.
+            fade = to_frames(event["crossfade_ms"] / 1000)
+            for voice in music_slots[0] + music_slots[1]:
+                voice.fade_out(frame, fade, "out")
+            samples = load(event["path"])
+            playlist_voice = Voice(samples, frame, loop=event.get("loop", True), fade_in=fade, curve="in") if samples is not None else None
+            if playlist_voice:
+                music_slots[1 - active_slot].append(playlist_voice); voices.append(playlist_voice)
+        elif kind == "music":
+            inactive_slot = 1 - active_slot
+            for voice in music_slots[inactive_slot]: voice.fade_out(frame, crossfade)
+            for voice in music_slots[active_slot]: voice.stop(frame)
+            samples = load(event["path"])
+            music_slots[active_slot] = [Voice(samples, frame, loop=True, fade_in=crossfade)] if samples is not None else []
+            voices.extend(music_slots[active_slot])
+            active_slot, playlist_voice = inactive_slot, None
+        elif kind == "playlist" and playlist_voice in music_slots[0] + music_slots[1]:
+            # Auto-advance on: the track ends after this pass. Off: it loops again.
+            if event["enabled"] and playlist_voice.end is None:
+                playlist_voice.loop, playlist_voice.end = True, playlist_voice.end_of_pass(frame)
+            elif not event["enabled"] and playlist_voice.end == playlist_voice.end_of_pass(frame) and playlist_voice.gain_values[-1]:
+                playlist_voice.loop, playlist_voice.end = True, None
+        elif kind == "effect":
+            samples = load(event["path"]) if event.get("path") else None
+            if samples is None:
+                continue
+            effects = [voice for voice in effects if voice.active_at(frame)]
+            same_sound = [voice for voice in effects if voice.path == event["path"]]
+            if len(same_sound) >= header["max_voices_per_sound"]:
+                victim(same_sound).stop(frame)
+            elif len(effects) >= header["effect_channels"]:
+                victim(effects).stop(frame)
+            voice = Voice(samples, frame, event["volume"], path=event["path"])
+            effects.append(voice); voices.append(voice)
+        elif kind == "music_volume":
+            volume_times.append(frame); volume_values.append(event["volume"])
+        elif kind == "stop_all":
+            for voice in music_slots[0] + music_slots[1]:
+                voice.fade_out(frame, crossfade)
+            for voice in effects:
+                if voice.active_at(frame): voice.fade_out(frame, effect_fade)
+        elif kind == "end":
+            end_frame = frame
+    if end_frame is None: # The session did not close cleanly; let the last fades finish
+        last_frame = to_frames(events[-1]["t"]) if events else 0
+        end_frame = max([last_frame + max(crossfade, effect_fade)] + [voice.end for voice in voices if voice.end is not None])
+    return voices, (numpy.array(volume_times), numpy.array(volume_values)), end_frame
+
+def mix(voices, music_volume, end_frame, channels, write, block_frames):
+    # Mixes block by block so memory stays flat however long the session was.
+    volume_times, volume_values = music_volume
+    waiting = sorted(voices, key=lambda voice: voice.start)
+    playing = []
+    for block_start in range(0, end_frame, block_frames):
+        block_end = min(end_frame, block_start + block_frames)
+        while waiting and waiting[0].start < block_end:
+            playing.append(waiting.pop(0))
+        block = numpy.zeros((block_end - block_start, channels), numpy.float64)
+        for voice in playing:
+            start = max(block_start, voice.start)
+            stop = block_end if voice.end is None else min(block_end, voice.end)
+            if start >= stop:
+                continue
+            frames = numpy.arange(start, stop)
+            gain = numpy.interp(frames, voice.gain_times, voice.gain_values)
+            if voice.volume is None:
+                gain *= volume_values[numpy.searchsorted(volume_times, frames, side="right") - 1]
+            else:
+                gain *= voice.volume
+            if voice.loop:
+                source = numpy.take(voice.samples, frames - voice.start, axis=0, mode="wrap")
+            else:
+                source = voice.samples[start - voice.start:stop - voice.start]
+            block[start - block_start:stop - block_start] += source * gain[:, None]
+        playing = [voice for voice in playing if voice.end is None or voice.end > block_end]
+        write(numpy.clip(numpy.round(block), -32768, 32767).astype("<i2").tobytes())
+
+def render(log_path, output_path, block_seconds=BLOCK_SECONDS):
+    if numpy is None:
+        raise RuntimeError("Rendering a session needs NumPy (pip install numpy)")
+    header, events = read_session(log_path)
+    frequency, size, channels = header["mixer"]
+    if size != -16:
+        raise ValueError(f"Only 16-bit signed sessions can be rendered, not a mixer size of {size}")
+
+    # A silent mixer in the session's format sets the format missing cache entries are converted to.
+    if auramixer.pygame.mixer.get_init() not in (None, (frequency, size, channels)):
+        auramixer.pygame.mixer.quit()
+    auramixer.init_pcm_converter((frequency, size, channels))
+    pcm_cache = auramixer.PcmCache(header.get("pcm_cache") or auramixer.get_cache_path({}, "audio"))
+    sources = {}
+    def load(path):
+        if path not in sources:
+            try:
+                sources[path] = numpy.memmap(pcm_cache.ensure(path), dtype="<i2", mode="r").reshape(-1, channels)
+            except (auramixer.pygame.error, OSError, ValueError) as error:
+                print(f"Skipping {path}: {error}", file=sys.stderr)
+                sources[path] = None
+        return sources[path]
+
+    started = time.perf_counter()
+    voices, music_volume, end_frame = build_timeline(header, events, load)
+    pcm_cache.release_converters()
+    with wave.open(output_path, "wb") as wav_file:
+        wav_file.setnchannels(channels); wav_file.setsampwidth(2); wav_file.setframerate(frequency)
+        mix(voices, music_volume, end_frame, channels, wav_file.writeframes, max(1, int(block_seconds * frequency)))
+    elapsed = time.perf_counter() - started
+    duration = end_frame / frequency
+    return {"duration_s": duration, "render_s": elapsed, "speed": duration / elapsed if elapsed else float("inf"), "voices": len(voices)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Mix a recorded Auramixer session into a WAV file.")
+    parser.add_argument("session", help="session log written while AURAMIXER_SESSION_DIR was set")
+    parser.add_argument("output", help="WAV file to write")
+    args = parser.parse_args()
+    try:
+        stats = render(args.session, args.output)
+    except (RuntimeError, ValueError, OSError) as error:
+        print(f"Error: {error}", file=sys.stderr)
+        return 1
+    print(f"Rendered {stats['duration_s']:.1f} s of audio ({stats['voices']} sounds) in {stats['render_s']:.2f} s, {stats['speed']:.0f}x real time.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,57 @@
 import unittest
 from unittest.mock import patch, MagicMock, call
 import os
+import subprocess
 import sys
+import tempfile
+import threading
+import time
+import wave
+
+# Let the tests that need a mixer or an event queue run without audio or display hardware.
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
 
 # We must import the script we are testing. Since it's not a module, we load it carefully.
 # This is a common pattern for testing standalone scripts.
 import auramixer
 
+def make_asset_tree(temp_dir):
+    # Empty backgrounds, effects and music folders laid out like the real media tree.
+    asset_paths = {'base': temp_dir, **{folder: os.path.join(temp_dir, folder) for folder in ('backgrounds', 'effects', 'music')}}
+    for folder in ('backgrounds', 'effects', 'music'):
+        os.makedirs(asset_paths[folder])
+    return asset_paths
+
+def write_wav(path, value, seconds, rate=44100, channels=2):
+    # A 16-bit WAV holding one sample value throughout, so a mix can be read back level by level.
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(channels); wav_file.setsampwidth(2); wav_file.setframerate(rate)
+        wav_file.writeframes(value.to_bytes(2, 'little', signed=True) * channels * int(rate * seconds))
+    return path
+
+def make_effect_sample(pcm_cache, path, nbytes):
+    # A real EffectSample whose cache entry (nbytes of silence in the mixer's format) is already written, so nothing is converted.
+    write_wav(path, 0, nbytes / 4 / 44100)
+    os.makedirs(pcm_cache.cache_dir, exist_ok=True)
+    with open(pcm_cache.entry_path(path), 'wb') as f:
+        f.write(bytes(nbytes))
+    return auramixer.EffectSample(path, pcm_cache)
+
 class TestAuramixer(unittest.TestCase):
 
+    def open_main_loop(self):
+        """Opens a dummy display, mixer and fonts for run_main_program and returns (screen, assets, audio) with one background and one effect."""
+        auramixer.pygame.display.init()
+        self.addCleanup(auramixer.pygame.display.quit)
+        auramixer.pygame.mixer.init(44100, -16, 2, 512)
+        self.addCleanup(auramixer.pygame.mixer.quit)
+        auramixer.pygame.font.init()
+        screen = auramixer.pygame.display.set_mode((320, 240))
+        assets = {'backgrounds': [auramixer.pygame.Surface((320, 240))],
+                  'effects': [auramixer.pygame.mixer.Sound(buffer=bytes(4410 * 4))], 'music': []}
+        return screen, assets, auramixer.AudioEngine(assets['music'])
+
     def test_get_resource_path_normal_mode(self):
         """Tests get_resource_path when running as a standard Python script."""
         # In normal mode, it should resolve to an absolute path based on the current directory.
@@ -121,6 +164,735 @@ class TestAuramixer(unittest.TestCase):
         self.assertIn('effects', missing)
         self.assertNotIn('music', missing)
 
+    @patch('auramixer.pygame.mixer.Sound')
+    @patch('os.listdir')
+    def test_load_all_assets_does_not_decode_music(self, mock_listdir, mock_sound):
+        """Tests that music files are registered for streaming instead of being decoded up front."""
+        mock_listdir.side_effect = lambda path: ['ambient.mp3'] if 'music' in path else []
+        asset_paths = {'backgrounds': '/fake/backgrounds', 'effects': '/fake/effects', 'music': '/fake/music'}
+
+        assets, _, missing = auramixer.load_all_assets(asset_paths)
+
+        mock_sound.assert_not_called()
+        self.assertIsInstance(assets['music'][0], auramixer.MusicTrack)
+        self.assertNotIn('music', missing)
+
+    @patch('auramixer.pygame.mixer.get_init', return_value=(44100, -16, 2))
+    def test_music_track_reads_matching_wav_in_blocks(self, mock_get_init):
+        """Tests that a WAV in the mixer format is streamed block by block and can loop."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            wav_path = os.path.join(temp_dir, 'bed.wav')
+            with wave.open(wav_path, 'wb') as wav_file:
+                wav_file.setnchannels(2); wav_file.setsampwidth(2); wav_file.setframerate(44100)
+                wav_file.writeframes(bytes(range(256)) * 4)
+
+            track = auramixer.MusicTrack(wav_path, auramixer.PcmCache(os.path.join(temp_dir, '.cache')))
+            reader = track.open_pcm()
+            try:
+                self.assertIsInstance(reader, auramixer.WavPcmReader)
+                first_block = reader.read(400)
+                self.assertEqual(len(first_block), 400)
+                self.assertEqual(len(reader.read(4096)), 624) # Only the remainder is left
+                reader.rewind()
+                self.assertEqual(reader.read(400), first_block)
+            finally:
+                reader.close()
+
+            # Nothing had to be transcoded into the cache folder.
+            self.assertFalse(os.path.exists(os.path.join(temp_dir, '.cache')))
+
+    @patch('os.listdir')
+    def test_asset_loader_publishes_in_folder_order(self, mock_listdir):
+        """Tests that effects decoded out of order are still published in folder order."""
+        mock_listdir.side_effect = lambda path: ['a.wav', 'b.wav', 'c.wav'] if 'effects' in path else (['m.ogg'] if 'music' in path else [])
+        asset_paths = {'backgrounds': '/fake/backgrounds', 'effects': '/fake/effects', 'music': '/fake/music'}
+        release_first = threading.Event()
+
+        def fake_decode(category, path):
+            if path.endswith('a.wav'):
+                release_first.wait(5)
+            return os.path.basename(path)
+
+        with patch('auramixer.decode_asset', side_effect=fake_decode):
+            loader = auramixer.AssetLoader(asset_paths, max_workers=3).start()
+            handled = 0
+            while handled < 2:
+                handled += loader.poll(block=True)
+
+            # 'b' and 'c' are decoded, but nothing is published until 'a' (the A key) is.
+            self.assertEqual(loader.assets['effects'], [])
+            self.assertFalse(loader.is_playable())
+
+            release_first.set()
+            loader.wait()
+
+        self.assertEqual(loader.assets['effects'], ['a.wav', 'b.wav', 'c.wav'])
+        self.assertTrue(loader.is_playable())
+        self.assertEqual(loader.status(), (False, ['backgrounds']))
+
+    def test_background_cache_round_trip_and_eviction(self):
+        """Tests that a warm background cache skips decoding and that stale entries are evicted."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            image_path = os.path.join(temp_dir, 'wide.png')
+            source = auramixer.pygame.Surface((40, 20)); source.fill((200, 10, 10))
+            auramixer.pygame.image.save(source, image_path)
+            cache_dir = os.path.join(temp_dir, '.cache')
+
+            cold = auramixer.BackgroundCache(cache_dir, (10, 10)).load(image_path)
+            self.assertEqual(cold.get_size(), (10, 10))
+            first_entry = os.listdir(cache_dir)
+            self.assertEqual(len(first_entry), 1)
+
+            # A warm start must not touch the image decoder at all.
+            with patch('auramixer.pygame.image.load', side_effect=AssertionError('decoded')):
+                warm = auramixer.BackgroundCache(cache_dir, (10, 10)).load(image_path)
+            self.assertEqual(warm.get_at((5, 5))[:3], (200, 10, 10))
+
+            # A different resolution is a new entry, and the old one is evicted after the scan.
+            cache = auramixer.BackgroundCache(cache_dir, (8, 6))
+            cache.load(image_path)
+            cache.evict_stale()
+            remaining = os.listdir(cache_dir)
+            self.assertEqual(len(remaining), 1)
+            self.assertNotEqual(remaining, first_entry)
+
+    def test_slideshow_stays_within_memory_budget(self):
+        """Tests that the slideshow keeps only a budget's worth of backgrounds and never drops pinned ones."""
+        sources = [auramixer.pygame.Surface((20, 10)) for _ in range(6)]
+        image_bytes = auramixer.pygame.Surface((10, 10)).get_pitch() * 10
+        slideshow = auramixer.Slideshow(sources, (10, 10), memory_budget=image_bytes * 2, prefetch_count=3)
+        try:
+            slideshow.pin(0)
+            self.assertIsNotNone(slideshow.load_now(0))
+            slideshow.prefetch_after(0)
+            while slideshow.busy:
+                slideshow.poll()
+
+            self.assertLessEqual(slideshow.resident_bytes, image_bytes * 2)
+            self.assertIsNotNone(slideshow.get(0)) # The pinned image survived the prefetch
+            # The image right after the pinned one was evicted first, so asking for it schedules a reload.
+            self.assertIsNone(slideshow.get(1))
+            self.assertTrue(slideshow.busy)
+        finally:
+            slideshow.close()
+
+    @patch('auramixer.time.perf_counter')
+    def test_background_crossfade_is_driven_by_elapsed_time(self, mock_clock):
+        """Tests that the fade position depends on elapsed time, not on how many frames were drawn."""
+        screen, current, target = (auramixer.pygame.Surface((4, 4)) for _ in range(3))
+        current.fill((0, 0, 0)); target.fill((200, 200, 200))
+        crossfade = auramixer.BackgroundCrossfade(duration_ms=100, easing='linear', blend_path='alpha')
+
+        mock_clock.return_value = 10.0
+        crossfade.start(current, target)
+        mock_clock.return_value = 10.05 # Halfway, however many frames came before
+        self.assertFalse(crossfade.draw(screen))
+        self.assertAlmostEqual(screen.get_at((0, 0))[0], 100, delta=2)
+
+        mock_clock.return_value = 10.5 # A long stall jumps straight to the end
+        self.assertTrue(crossfade.draw(screen))
+        self.assertEqual(screen.get_at((0, 0))[0], 200)
+        self.assertFalse(crossfade.active)
+        self.assertEqual(crossfade.last_cost_ms, 0.0) # Read by the perf monitor after each fade frame
+
+    @unittest.skipIf(auramixer.numpy is None, 'numpy is not installed')
+    def test_numpy_blend_matches_alpha_blend(self):
+        """Tests that the array blend path produces the same picture as the alpha blit path."""
+        current, target = auramixer.pygame.Surface((16, 9), depth=32), auramixer.pygame.Surface((16, 9), depth=32)
+        current.fill((10, 200, 30)); target.fill((250, 0, 90))
+        via_alpha, via_numpy = auramixer.pygame.Surface((16, 9), depth=32), auramixer.pygame.Surface((16, 9), depth=32)
+
+        auramixer.blend_with_alpha(via_alpha, current, target, 96)
+        auramixer.blend_with_numpy(via_numpy, current, target, 96)
+
+        for expected, actual in zip(via_alpha.get_at((7, 4))[:3], via_numpy.get_at((7, 4))[:3]):
+            self.assertAlmostEqual(expected, actual, delta=2)
+
+    def test_overlay_only_rerenders_changed_fields(self):
+        """Tests that the HUD re-renders just the field that changed and reuses cached panels otherwise."""
+        auramixer.pygame.font.init()
+        overlay = auramixer.OverlayCompositor()
+        screen = auramixer.pygame.Surface((800, 600))
+        self.assertTrue(overlay.update_hud(0.5, 0.7, 'rain.ogg'))
+        overlay.draw(screen)
+        help_surface, hud_surface = overlay.help_panel.surface, overlay.hud_panel.surface
+
+        # Count renders through every field that uses the text font.
+        counting_font = MagicMock(wraps=overlay._fonts['text'])
+        for field in overlay.help_panel.fields + overlay.hud_panel.fields:
+            if field.font is overlay._fonts['text']:
+                field.font = counting_font
+
+        self.assertFalse(overlay.update_hud(0.5, 0.7, 'rain.ogg'))
+        overlay.draw(screen)
+        counting_font.render.assert_not_called()
+        self.assertIs(overlay.hud_panel.surface, hud_surface)
+
+        self.assertTrue(overlay.update_hud(0.6, 0.7, 'rain.ogg'))
+        overlay.draw(screen)
+
+        self.assertEqual(counting_font.render.call_count, 1) # Only the music volume line
+        self.assertIs(overlay.help_panel.surface, help_surface)
+        self.assertIsNot(overlay.hud_panel.surface, hud_surface)
+
+    def test_asset_watcher_decodes_only_changed_files(self):
+        """Tests that a rescan reports added, changed and removed files and decodes only what changed."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            asset_paths = make_asset_tree(temp_dir)
+            for name in ('keep.wav', 'edit.wav', 'gone.wav'):
+                with open(os.path.join(asset_paths['effects'], name), 'wb') as f:
+                    f.write(b'1234')
+
+            watcher = auramixer.AssetWatcher(asset_paths, max_workers=1)
+            with open(os.path.join(asset_paths['effects'], 'edit.wav'), 'ab') as f:
+                f.write(b'5678') # New size, so it counts as changed
+            os.remove(os.path.join(asset_paths['effects'], 'gone.wav'))
+            with open(os.path.join(asset_paths['effects'], 'new.wav'), 'wb') as f:
+                f.write(b'1234')
+
+            with patch('auramixer.decode_asset', side_effect=lambda category, path: 'sound:' + os.path.basename(path)) as mock_decode:
+                self.assertEqual(watcher.check(), 3)
+                updates = []
+                while watcher.busy:
+                    updates += watcher.poll()
+            watcher.close()
+
+        decoded = sorted(os.path.basename(call_args.args[1]) for call_args in mock_decode.call_args_list)
+        self.assertEqual(decoded, ['edit.wav', 'new.wav'])
+        results = {os.path.basename(path): asset for _, path, asset in updates}
+        self.assertEqual(results, {'gone.wav': None, 'edit.wav': 'sound:edit.wav', 'new.wav': 'sound:new.wav'})
+
+    def test_voice_pool_caps_polyphony_and_steals_oldest(self):
+        """Tests that an effect never exceeds its voice cap and a full pool steals instead of dropping."""
+        auramixer.pygame.mixer.init(44100, -16, 2, 512)
+        self.addCleanup(auramixer.pygame.mixer.quit)
+        long_sound = auramixer.pygame.mixer.Sound(buffer=bytes(44100 * 4 * 5))
+        other_sound = auramixer.pygame.mixer.Sound(buffer=bytes(44100 * 4 * 5))
+        pool = auramixer.EffectVoicePool(0, 3, max_voices_per_sound=2, stealing='oldest')
+
+        first = pool.play(long_sound, 0.5)
+        pool.play(long_sound, 0.5)
+        third = pool.play(long_sound, 0.5) # Over the cap: replaces the oldest voice of this effect
+        self.assertIs(third, first)
+        self.assertEqual(pool.stolen_count, 1)
+        self.assertEqual(pool.busy_count(), 2)
+
+        pool.play(other_sound, 0.8) # Takes the last free channel
+        stolen = pool.play(other_sound, 0.3) # Pool full: the oldest voice overall goes
+        self.assertEqual(pool.stolen_count, 2)
+        self.assertEqual(pool.busy_count(), 3)
+        self.assertIs(stolen.get_sound(), other_sound)
+        self.assertAlmostEqual(stolen.get_volume(), 0.3, places=1)
+
+    def test_trigger_latency_from_key_event_to_channel_play(self):
+        """Tests that a key event reaches Channel.play well within one mixer buffer."""
+        auramixer.pygame.display.init()
+        self.addCleanup(auramixer.pygame.display.quit)
+        auramixer.pygame.mixer.init(44100, -16, 2, 512)
+        self.addCleanup(auramixer.pygame.mixer.quit)
+        sound = auramixer.pygame.mixer.Sound(buffer=bytes(4410 * 4))
+        pool = auramixer.EffectVoicePool(0, 8)
+
+        report = auramixer.measure_trigger_latency(pool, sound, trials=50, buffer_size=512)
+
+        self.assertEqual(report['trials'], 50)
+        self.assertLess(report['median_ms'], report['mixer_buffer_ms'])
+
+    def test_main_loop_reports_frames_and_trigger_latency(self):
+        """Tests that the main loop reports presented frames and effect latency measured from the event's trigger time."""
+        screen, assets, audio = self.open_main_loop()
+        frames = []
+
+        # Key presses from another thread carry the time they were made.
+        def press_and_quit():
+            pygame = auramixer.pygame
+            pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_a, triggered_at=auramixer.time.perf_counter()))
+            pygame.event.post(pygame.event.Event(pygame.QUIT))
+        threading.Timer(0.2, press_and_quit).start()
+        auramixer.run_main_program(screen, assets, None, audio, lambda work_ms, fading: frames.append(work_ms))
+
+        self.assertEqual(len(audio.effect_latencies_ms), 1)
+        self.assertGreaterEqual(audio.effect_latencies_ms[0], 0)
+        self.assertTrue(frames) # At least the first full-screen frame
+
+    def test_idle_main_loop_presents_no_frames_but_wakes_for_keys(self):
+        """Tests that the main loop only presents its first frame while nothing changes, yet handles a key press within IDLE_WAIT_MS."""
+        screen, assets, audio = self.open_main_loop()
+        frames = []
+
+        # Idle for a second (several IDLE_WAIT_MS periods), then one key press, then quit.
+        def press_and_quit():
+            pygame = auramixer.pygame
+            pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_a, triggered_at=auramixer.time.perf_counter()))
+            threading.Timer(0.2, lambda: pygame.event.post(pygame.event.Event(pygame.QUIT))).start()
+        threading.Timer(1.0, press_and_quit).start()
+        auramixer.run_main_program(screen, assets, None, audio, lambda work_ms, fading: frames.append(work_ms))
+
+        self.assertLessEqual(len(frames), 2) # The first full-screen frame (and the HUD settling), not one per 16 ms
+        self.assertEqual(len(audio.effect_latencies_ms), 1)
+        self.assertLess(audio.effect_latencies_ms[0], auramixer.IDLE_WAIT_MS) # event.wait returns as soon as the key arrives
+
+    def test_benchmark_flags_regressions_against_baseline(self):
+        """Tests that only timing and memory figures beyond the tolerance are reported as regressions."""
+        import benchmark_auramixer
+        baseline = {'load_cold': {'load_all_assets_ms': 100.0, 'peak_rss_mb': 50.0}, 'run': {'effect_trigger_latency': {'count': 10, 'p99_ms': 2.0}}}
+        report = {'load_cold': {'load_all_assets_ms': 110.0, 'peak_rss_mb': 80.0}, 'run': {'effect_trigger_latency': {'count': 99, 'p99_ms': 3.0}}}
+
+        regressions = benchmark_auramixer.find_regressions(report, baseline, tolerance=0.25)
+
+        self.assertEqual(sorted(r['metric'] for r in regressions), ['load_cold.peak_rss_mb', 'run.effect_trigger_latency.p99_ms'])
+
+    def test_perf_monitor_histogram_and_csv_dump(self):
+        """Tests that the perf monitor is off by default, buckets frame times and appends CSV rows under one header."""
+        self.assertFalse(auramixer.PerfMonitor(metrics_file=None).enabled)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            metrics_file = os.path.join(temp_dir, 'metrics.csv')
+            perf = auramixer.PerfMonitor(metrics_file, histogram_edges_ms=(10, 20))
+            self.assertTrue(perf.enabled) # A metrics file turns measuring on without the overlay
+
+            for frame_ms in (5, 15, 15, 40):
+                perf.record_frame(frame_ms, 1.0, 0.5)
+            self.assertEqual(perf.frame_histogram, [1, 2, 1])
+            for blend_ms in (2.0, 3.0, 9.0):
+                perf.record_fade(blend_ms)
+            self.assertEqual((perf.snapshot()['fade_p50_ms'], perf.snapshot()['fade_max_ms']), (3.0, 9.0))
+            perf.dump(); perf.dump()
+
+            with open(metrics_file) as f:
+                rows = f.read().splitlines()
+        self.assertEqual(len(rows), 3)
+        self.assertTrue(rows[0].startswith('time,frame_p50_ms'))
+        self.assertIn('frames_over_20ms', rows[0])
+        self.assertIn('fade_max_ms', rows[0])
+
+    def test_pcm_cache_converts_once_in_worker_processes(self):
+        """Tests that effects are converted into the PCM cache by the process pool once and loaded from it afterwards."""
+        auramixer.pygame.mixer.init(44100, -16, 2, 512)
+        self.addCleanup(auramixer.pygame.mixer.quit)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            asset_paths = make_asset_tree(temp_dir)
+            # Half the mixer's rate and mono, so it has to be converted.
+            write_wav(os.path.join(asset_paths['effects'], 'chime.wav'), 16, 1, rate=22050, channels=1)
+
+            cold = auramixer.AssetLoader(asset_paths)
+            cold.start()
+            self.assertIsNotNone(cold.pcm_cache._converters[False])
+            cold.wait()
+            self.assertIsNone(cold.pcm_cache._converters[False]) # Released once everything has loaded
+            cold.close()
+            entries = os.listdir(os.path.join(temp_dir, '.cache', 'audio'))
+            self.assertEqual(len(entries), 1)
+            self.assertEqual(os.path.getsize(os.path.join(temp_dir, '.cache', 'audio', entries[0])), 44100 * 4)
+
+            warm = auramixer.AssetLoader(asset_paths)
+            warm.start()
+            self.assertIsNone(warm.pcm_cache._converters[False]) # Nothing left to convert
+            warm.wait()
+            effect = warm.assets['effects'][0]
+            self.assertIsNone(effect.sound) # Converted but not decoded until it is needed
+            self.assertAlmostEqual(effect.load().get_length(), 1.0, places=2)
+
+            # A different mixer format needs entries of its own.
+            self.assertNotEqual(warm.pcm_cache.entry_path(os.path.join(asset_paths['effects'], 'chime.wav'), (48000, -16, 2)),
+                                os.path.join(temp_dir, '.cache', 'audio', entries[0]))
+
+    @patch('auramixer.PCM_LONG_TRACK_SECONDS', 1.5)
+    def test_long_tracks_convert_one_at_a_time(self):
+        """Tests that files longer than PCM_LONG_TRACK_SECONDS are converted by a single-process pool of their own."""
+        auramixer.pygame.mixer.init(44100, -16, 2, 512)
+        self.addCleanup(auramixer.pygame.mixer.quit)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            asset_paths = make_asset_tree(temp_dir)
+            # Mono at half the rate, so both need converting; the manifest reads their durations from the headers.
+            for folder, seconds in (('effects', 1), ('music', 2)):
+                write_wav(os.path.join(asset_paths[folder], f'{folder}.wav'), 16, seconds, rate=22050, channels=1)
+
+            loader = auramixer.AssetLoader(asset_paths)
+            loader.start()
+            self.assertEqual(loader.pcm_cache._converters[True]._max_workers, 1)
+            self.assertEqual(loader.pcm_cache._converters[False]._max_workers, auramixer.PCM_CONVERTER_WORKERS) # The short effect
+            loader.wait()
+            entry = loader.pcm_cache.ensure(os.path.join(asset_paths['music'], 'music.wav'))
+            loader.close()
+            self.assertEqual(os.path.getsize(entry), 2 * 44100 * 4) # Written whole from the Sound's buffer
+
+    @patch('auramixer.PCM_LONG_TRACK_SECONDS', 1.5)
+    def test_asset_watcher_converts_changed_audio_in_converter_processes(self):
+        """Tests that audio added after startup is converted on the PCM cache's process pools, long music on the single-process one."""
+        auramixer.pygame.mixer.init(44100, -16, 2, 512)
+        self.addCleanup(auramixer.pygame.mixer.quit)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            asset_paths = make_asset_tree(temp_dir)
+            pcm_cache = auramixer.PcmCache(os.path.join(temp_dir, '.cache', 'audio'))
+            watcher = auramixer.AssetWatcher(asset_paths, pcm_cache=pcm_cache, manifest=auramixer.AssetManifest(asset_paths), max_workers=1)
+            self.addCleanup(watcher.close)
+            # Mono at half the rate, so both need converting.
+            for folder, seconds in (('effects', 1), ('music', 2)):
+                write_wav(os.path.join(asset_paths[folder], f'{folder}.wav'), 16, seconds, rate=22050, channels=1)
+
+            with patch.object(pcm_cache, 'converter', wraps=pcm_cache.converter) as mock_converter:
+                self.assertEqual(watcher.check(), 2)
+            self.assertEqual(sorted(call_args.args for call_args in mock_converter.call_args_list), [(False,), (True,)])
+            self.assertEqual(pcm_cache._converters, {False: None, True: None}) # Released; the queued work still finishes
+            updates = []
+            deadline = time.perf_counter() + 30
+            while watcher.busy and time.perf_counter() < deadline:
+                updates += watcher.poll()
+                time.sleep(0.01)
+            results = {category: asset for category, _, asset in updates}
+            self.assertEqual(results['effects'].nbytes, 44100 * 4)
+            reader = results['music'].open_pcm()
+            self.assertEqual(len(reader.read(1 << 20)), 2 * 44100 * 4)
+            reader.close()
+
+    def test_effect_library_evicts_least_recently_played(self):
+        """Tests that the effect library stays within its budget, counts hits and misses, and prefetches only into free room."""
+        auramixer.pygame.mixer.init(44100, -16, 2, 512)
+        self.addCleanup(auramixer.pygame.mixer.quit)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pcm_cache = auramixer.PcmCache(os.path.join(temp_dir, 'cache'))
+            a, b, c, x, y = (make_effect_sample(pcm_cache, os.path.join(temp_dir, f'{name}.wav'), 100) for name in 'abcxy')
+            library = auramixer.EffectLibrary(budget_bytes=250)
+
+            with patch.object(pcm_cache, 'load_sound', wraps=pcm_cache.load_sound) as mock_load:
+                self.assertIsInstance(library.sound(a), auramixer.pygame.mixer.Sound)
+                library.sound(b)
+                library.sound(a) # Hit: 'a' becomes the most recently played
+                library.sound(c) # Over budget: 'b' is the least recently played
+                self.assertIsNone(b.sound)
+                self.assertEqual((library.hits, library.misses, library.evictions, library.resident_bytes), (1, 3, 1, 200))
+                self.assertIs(library.sound(b), b.sound) # Reloaded on demand from its cache file
+            self.assertEqual([call_args.args[0] for call_args in mock_load.call_args_list].count(b.path), 2)
+
+            prefetching = auramixer.EffectLibrary(budget_bytes=150)
+            prefetching.prefetch([x, y])
+            prefetching._executor.shutdown(wait=True)
+            self.assertIsNotNone(x.sound)
+            self.assertIsNone(y.sound) # No room, and prefetching never evicts
+            self.assertEqual(prefetching.prefetched, 1)
+
+    def test_banks_page_keys_and_keep_neighbours_decoded(self):
+        """Tests that keys map into the active bank and only the active bank and its neighbours stay resident."""
+        auramixer.pygame.mixer.init(44100, -16, 2, 512)
+        self.addCleanup(auramixer.pygame.mixer.quit)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pcm_cache = auramixer.PcmCache(os.path.join(temp_dir, 'cache'))
+            effects = [make_effect_sample(pcm_cache, os.path.join(temp_dir, f'effect{i}.wav'), 12) for i in range(26 * 4 + 3)]
+            library = auramixer.EffectLibrary(budget_bytes=10**6)
+            for effect in effects:
+                library.sound(effect) # Start with everything resident
+            banks = auramixer.BankSelector(effects, 26)
+
+            self.assertEqual(banks.bank_count, 5)
+            banks.step(2)
+            self.assertEqual(banks.index(0), 52) # 'A' in the third bank
+            banks.step(2)
+            self.assertEqual(banks.index(2), 106)
+            self.assertIsNone(banks.index(3)) # Past the end of the short last bank
+            self.assertEqual(banks.label(), '5/5 (105-107 of 107)')
+
+            library.retain(banks.nearby_items())
+            resident = [i for i, effect in enumerate(effects) if effect.sound is not None]
+            self.assertEqual(resident, list(range(0, 26)) + list(range(78, 107))) # Wraps around to the first bank
+            self.assertEqual(library.evictions, 52)
+
+            banks.step(1) # Wraps to the first bank
+            self.assertEqual(banks.bank, 0)
+
+    def test_session_recorder_logs_engine_events(self):
+        """Tests that a recording starts with the engine settings and logs each trigger, volume change and stop-all."""
+        import json
+        auramixer.pygame.mixer.init(44100, -16, 2, 512)
+        self.addCleanup(auramixer.pygame.mixer.quit)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            effect = make_effect_sample(auramixer.PcmCache(temp_dir), os.path.join(temp_dir, 'chime.wav'), 4)
+            audio = auramixer.AudioEngine([])
+            audio.start_recording(os.path.join(temp_dir, 'session.jsonl'), temp_dir)
+
+            audio.play_effect(effect)
+            audio.set_music_volume(0.3)
+            audio.stop_all()
+            audio.close()
+            with open(os.path.join(temp_dir, 'session.jsonl')) as f:
+                records = [json.loads(line) for line in f]
+
+        header, events = records[0], records[1:]
+        self.assertEqual((header['format'], header['mixer'], header['pcm_cache']), ('auramixer-session', [44100, -16, 2], temp_dir))
+        self.assertEqual(header['effect_stop_fade_ms'], auramixer.EFFECT_STOP_FADE_MS)
+        self.assertEqual([event['event'] for event in events], ['effect', 'music_volume', 'stop_all', 'end'])
+        self.assertEqual((events[0]['path'], events[0]['volume']), (effect.path, 0.7))
+        self.assertEqual(events, sorted(events, key=lambda event: event['t'])) # Timestamps only go forward
+
+    def test_render_session_reproduces_fades_offline(self):
+        """Tests that a session log is mixed with the engine's crossfade, volumes, looping and stop-all fade."""
+        import json
+        import numpy
+        import render_session
+        self.addCleanup(auramixer.pygame.mixer.quit)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            music, effect = write_wav(os.path.join(temp_dir, 'music.wav'), 1000, 1.0), write_wav(os.path.join(temp_dir, 'effect.wav'), 2000, 2.0)
+            header = {'format': 'auramixer-session', 'version': 1, 'mixer': [44100, -16, 2], 'pcm_cache': os.path.join(temp_dir, 'cache'),
+                      'crossfade_ms': 1000, 'effect_stop_fade_ms': 500, 'effect_channels': 30, 'max_voices_per_sound': 4,
+                      'stealing': 'oldest', 'music_volume': 0.5, 'effect_volume': 0.7}
+            events = [{'t': 0.0, 'event': 'music', 'path': music}, {'t': 1.0, 'event': 'effect', 'path': effect, 'volume': 1.0},
+                      {'t': 2.0, 'event': 'stop_all'}, {'t': 3.0, 'event': 'end'}]
+            with open(os.path.join(temp_dir, 'session.jsonl'), 'w') as f:
+                f.writelines(json.dumps(record) + '\n' for record in [header] + events)
+
+            stats = render_session.render(os.path.join(temp_dir, 'session.jsonl'), os.path.join(temp_dir, 'out.wav'), block_seconds=0.7)
+            with wave.open(os.path.join(temp_dir, 'out.wav')) as wav_file:
+                self.assertEqual(wav_file.getnframes(), 3 * 44100)
+                left = numpy.frombuffer(wav_file.readframes(wav_file.getnframes()), '<i2')[::2]
+
+        self.assertEqual(stats['voices'], 2)
+        at = lambda seconds: int(left[int(seconds * 44100)])
+        self.assertEqual(at(0), 0) # The music fades in...
+        self.assertEqual(at(0.5), 250) # ...halfway, at half the music volume
+        self.assertEqual(at(1.5), 500 + 2000) # Looped music plus the effect
+        self.assertEqual(at(2.25), 375 + 1000) # Both fading out after stop-all
+        self.assertEqual(at(2.75), 125) # The effect's shorter fade is over
+
+    def test_music_scheduler_crossfades_gaplessly_on_exact_samples(self):
+        """Tests that playlist auto-advance starts its equal-power crossfade a fixed number of samples before the track ends."""
+        import numpy
+        auramixer.pygame.mixer.init(44100, -16, 2, 512)
+        self.addCleanup(auramixer.pygame.mixer.quit)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            tracks = []
+            for name, value in (('a.wav', 1000), ('b.wav', 2000)):
+                tracks.append(auramixer.MusicTrack(write_wav(os.path.join(temp_dir, name), value, 0.5), auramixer.PcmCache(os.path.join(temp_dir, 'cache'))))
+            scheduler = auramixer.MusicScheduler(tracks, tracks[0], auramixer.pygame.mixer.Channel(0), 1.0, crossfade_ms=100, block_ms=50)
+            self.addCleanup(scheduler.stop)
+            # Render the stream as the scheduler thread would, letting each prefetch finish first.
+            blocks = []
+            while sum(len(block) for block in blocks) < 4 * 44100 * 1.1:
+                for pending in (scheduler._opening, scheduler._upcoming):
+                    if pending: pending[1].result()
+                blocks.append(scheduler._render_block())
+            left = numpy.frombuffer(b''.join(blocks), numpy.int16)[::2]
+
+        self.assertEqual(left[22050 - 4410 - 1], 1000) # Track a alone until 100 ms before its end
+        self.assertAlmostEqual(int(left[22050 - 2205]), 707 + 1414, delta=2) # Equal power halfway: both at cos(45°)
+        self.assertEqual(left[22050], 2000) # Track b alone once a has ended
+        self.assertEqual(left[39690 + 10], 1000) # Back to a after b, 100 ms before b's end
+        self.assertEqual(numpy.count_nonzero(left == 0), 0) # No gap anywhere in the stream
+
+    def test_switching_tracks_never_waits_for_a_slow_open(self):
+        """Tests that a stream still opening its track is stopped without blocking, and cannot cut the stream that takes its channel when it finally exits."""
+        auramixer.pygame.mixer.init(44100, -16, 2, 512)
+        self.addCleanup(auramixer.pygame.mixer.quit)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            tracks = []
+            for name in ('a.wav', 'b.wav', 'c.wav'):
+                tracks.append(auramixer.MusicTrack(write_wav(os.path.join(temp_dir, name), 16, 5), auramixer.PcmCache(os.path.join(temp_dir, 'cache'))))
+            # Track a takes until `converted` is set to open, as if its PCM conversion were still running.
+            converted = threading.Event()
+            open_a = tracks[0].open_pcm
+            tracks[0].open_pcm = lambda: converted.wait(5) and open_a()
+            engine = auramixer.AudioEngine(tracks)
+            engine.playlist_mode = False
+            self.addCleanup(engine.close)
+
+            engine.play_music(0)
+            slow_stream = engine.music_streams[engine.music_channels[0]]
+            engine.play_music(1)
+            started = time.perf_counter()
+            engine.play_music(2) # Stops a's stream, which is stuck opening on channel 0
+            self.assertLess(time.perf_counter() - started, 0.1)
+
+            new_stream = engine.music_streams[engine.music_channels[0]]
+            deadline = time.perf_counter() + 2.0
+            while not engine.music_channels[0].get_busy() and time.perf_counter() < deadline:
+                time.sleep(0.01)
+            converted.set() # a's thread wakes up, sees it was stopped and exits
+            slow_stream.join(timeout=2.0)
+            self.assertTrue(slow_stream.finished)
+            self.assertTrue(engine.music_channels[0].get_busy()) # c keeps playing
+            self.assertFalse(new_stream.finished)
+
+    def test_playlist_index_follows_heard_transitions_on_the_main_loop(self):
+        """Tests that in playlist mode the track index only changes when the main loop applies a heard transition, and never for a track that fails to open."""
+        auramixer.pygame.mixer.init(44100, -16, 2, 512)
+        self.addCleanup(auramixer.pygame.mixer.quit)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            tracks = []
+            for name in ('a.wav', 'b.wav', 'missing.wav'):
+                path = write_wav(os.path.join(temp_dir, name), 16, 5) if name != 'missing.wav' else os.path.join(temp_dir, name)
+                tracks.append(auramixer.MusicTrack(path, auramixer.PcmCache(os.path.join(temp_dir, 'cache'))))
+            engine = auramixer.AudioEngine(tracks)
+            engine.playlist_mode = True
+            self.addCleanup(engine.close)
+
+            def wait_for_index(expected):
+                deadline = time.perf_counter() + 2.0
+                while time.perf_counter() < deadline:
+                    engine.apply_playlist_transitions()
+                    if engine.current_music_index == expected:
+                        return True
+                    time.sleep(0.01)
+                return False
+
+            engine.play_music(0)
+            self.assertIsNone(engine.current_music_index) # Nothing heard yet
+            self.assertTrue(wait_for_index(0))
+            engine.play_music(1, triggered_at=time.perf_counter())
+            self.assertEqual(engine.current_music_index, 0) # Still a until the crossfade is queued
+            self.assertTrue(wait_for_index(1))
+            self.assertEqual(len(engine.music_latencies_ms), 1)
+            self.assertLess(engine.music_latencies_ms[0], 4 * auramixer.PLAYLIST_BLOCK_MS)
+
+            engine.play_music(2) # Cannot be opened: b keeps playing and keeps its index
+            time.sleep(0.3)
+            engine.apply_playlist_transitions()
+            self.assertEqual(engine.current_music_index, 1)
+
+    def test_render_session_follows_playlist_transitions(self):
+        """Tests that playlist transitions are rendered with their equal-power crossfade and that tracks stop looping in playlist mode."""
+        import json
+        import numpy
+        import render_session
+        self.addCleanup(auramixer.pygame.mixer.quit)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = []
+            for name, value in (('a.wav', 1000), ('b.wav', 2000)):
+                paths.append(write_wav(os.path.join(temp_dir, name), value, 1))
+            header = {'format': 'auramixer-session', 'version': 1, 'mixer': [44100, -16, 2], 'pcm_cache': os.path.join(temp_dir, 'cache'),
+                      'crossfade_ms': 1000, 'effect_stop_fade_ms': 500, 'effect_channels': 30, 'max_voices_per_sound': 4,
+                      'stealing': 'oldest', 'music_volume': 1.0, 'effect_volume': 0.7}
+            # Transitions are logged ahead of time with the time they are heard, so the log is out of order.
+            events = [{'t': 0.0, 'event': 'music', 'path': paths[0], 'curve': 'equal-power', 'crossfade_ms': 0, 'loop': True},
+                      {'t': 2.5, 'event': 'music', 'path': paths[1], 'curve': 'equal-power', 'crossfade_ms': 500, 'loop': False},
+                      {'t': 1.2, 'event': 'playlist', 'enabled': True}, {'t': 4.0, 'event': 'end'}]
+            with open(os.path.join(temp_dir, 'session.jsonl'), 'w') as f:
+                f.writelines(json.dumps(record) + '\n' for record in [header] + events)
+
+            render_session.render(os.path.join(temp_dir, 'session.jsonl'), os.path.join(temp_dir, 'out.wav'))
+            with wave.open(os.path.join(temp_dir, 'out.wav')) as wav_file:
+                left = numpy.frombuffer(wav_file.readframes(wav_file.getnframes()), '<i2')[::2]
+
+        at = lambda seconds: int(left[int(seconds * 44100)])
+        self.assertEqual(at(1.5), 1000) # Track a loops until playlist mode is switched on...
+        self.assertEqual(at(2.2), 0) # ...and then ends with its current pass
+        self.assertAlmostEqual(at(2.75), 1414, delta=2) # b's equal-power fade-in is at sin(45°) halfway
+        self.assertEqual(at(3.2), 2000)
+        self.assertEqual(at(3.7), 0) # b does not loop in playlist mode either
+
+    @unittest.skipUnless(hasattr(auramixer.socket, 'AF_UNIX'), 'needs Unix domain sockets')
+    def test_control_socket_is_the_instance_lock_and_forwards_commands(self):
+        """Tests that the first instance binds the control socket, batches are queued before the main loop runs and a second launch forwards its command."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            address = (auramixer.socket.AF_UNIX, os.path.join(temp_dir, 'control.sock'))
+            # A socket file left behind by a crash is taken over.
+            stale = auramixer.socket.socket(auramixer.socket.AF_UNIX)
+            stale.bind(address[1]); stale.close()
+            server = auramixer.setup_single_instance_lock(address=address)
+            self.addCleanup(server.close)
+
+            self.assertEqual(auramixer.send_control_command('ping', address), 'pong auramixer')
+            self.assertEqual(auramixer.send_control_command('effect 2; music rain; music-volume 1.5', address), 'queued') # No main loop yet
+            self.assertTrue(auramixer.send_control_command('explode', address).startswith('error'))
+            with self.assertRaises(SystemExit) as exit_status:
+                auramixer.setup_single_instance_lock('stop', address=address) # The second launch
+            self.assertEqual(exit_status.exception.code, 0)
+
+            batches = server.drain()
+        self.assertEqual([commands for commands, _, _ in batches],
+                         [[('effect', 2), ('music', 'rain'), ('music-volume', 1.0)], [('stop', None)]])
+
+    @unittest.skipUnless(hasattr(auramixer.socket, 'AF_UNIX'), 'needs Unix domain sockets')
+    def test_main_loop_runs_control_batches(self):
+        """Tests that a batch sent over the control socket wakes the main loop, runs in one go and is answered with what could not run."""
+        screen, assets, audio = self.open_main_loop()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            address = (auramixer.socket.AF_UNIX, os.path.join(temp_dir, 'control.sock'))
+            control = auramixer.ControlServer(address).start()
+            self.addCleanup(control.close)
+
+            replies = []
+            def send():
+                replies.extend(auramixer.send_control_command(text, address) for text in ('effect-volume 0.4; effect 1', 'effect 2; music rain'))
+                # Like `echo "effect 1" | nc -U`: the sender stops writing before the reply is ready.
+                with auramixer.socket.socket(auramixer.socket.AF_UNIX) as connection:
+                    connection.settimeout(5.0)
+                    connection.connect(address[1])
+                    connection.sendall(b'effect 1\n')
+                    connection.shutdown(auramixer.socket.SHUT_WR)
+                    received = b''
+                    while chunk := connection.recv(4096):
+                        received += chunk
+                    replies.append(received.decode())
+                replies.append(auramixer.send_control_command('quit', address))
+            sender = threading.Timer(0.2, send)
+            sender.start()
+            auramixer.run_main_program(screen, assets, None, audio, control=control)
+            control.close() # Sends the reply to quit
+            sender.join()
+
+        # Replies come after the main loop ran the batch, so a missing file is reported rather than dropped.
+        self.assertEqual(replies, ['ok', "error: no effect '2'; no music track 'rain'", 'ok\n', 'ok'])
+        self.assertEqual(audio.effect_volume, 0.4)
+        self.assertEqual(len(audio.effect_latencies_ms), 2) # Measured from the moment the batch was read
+
+    def test_probe_media_file_reads_headers_only(self):
+        """Tests that image sizes and audio formats come from file headers and that bad files raise ValueError."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            def write(name, data):
+                with open(os.path.join(temp_dir, name), 'wb') as f:
+                    f.write(data)
+                return os.path.join(temp_dir, name)
+            png = os.path.join(temp_dir, 'image.png')
+            auramixer.pygame.image.save(auramixer.pygame.Surface((64, 48)), png)
+            wav = write_wav(os.path.join(temp_dir, 'tone.wav'), 0, 0.5, rate=22050)
+            # STREAMINFO of a 48 kHz stereo 24-bit FLAC holding 96000 samples.
+            streaminfo = (48000 << 44 | 1 << 41 | 23 << 36 | 96000).to_bytes(8, 'big')
+            flac = write('song.flac', b'fLaC' + bytes([0, 0, 0, 34]) + bytes(10) + streaminfo + bytes(16))
+            # A 128 kbit/s 44.1 kHz stereo MPEG-1 layer III frame, twice, behind an ID3 tag.
+            frame = b'\xff\xfb\x90\x00' + bytes(413)
+            mp3 = write('song.mp3', b'ID3\x03\x00\x00\x00\x00\x00\x05' + bytes(5) + frame * 2)
+
+            self.assertEqual(auramixer.probe_media_file(png), {'kind': 'image', 'format': 'png', 'width': 64, 'height': 48})
+            self.assertEqual(auramixer.probe_media_file(wav), {'kind': 'audio', 'format': 'wav', 'codec': 'pcm', 'rate': 22050, 'channels': 2, 'bits': 16, 'duration': 0.5})
+            self.assertEqual(auramixer.probe_media_file(flac), {'kind': 'audio', 'format': 'flac', 'rate': 48000, 'channels': 2, 'bits': 24, 'duration': 2.0})
+            mp3_info = auramixer.probe_media_file(mp3)
+            self.assertEqual((mp3_info['rate'], mp3_info['channels']), (44100, 2))
+            self.assertAlmostEqual(mp3_info['duration'], 2 * 417 * 8 / 128000)
+
+            for name, data in (('empty.png', b''), ('text.png', b'not an image'), ('cut.jpg', b'\xff\xd8\xff\xe0\x00'), ('cut.wav', b'RIFF\x00\x00\x00\x00WAVEfmt ')):
+                with self.assertRaises(ValueError):
+                    auramixer.probe_media_file(write(name, data))
+
+    def test_loader_skips_files_rejected_by_the_manifest(self):
+        """Tests that the loader never decodes files with bad headers and that a warm manifest is not probed again."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            asset_paths = make_asset_tree(temp_dir)
+            auramixer.pygame.image.save(auramixer.pygame.Surface((8, 8)), os.path.join(asset_paths['backgrounds'], 'good.png'))
+            with open(os.path.join(asset_paths['backgrounds'], 'bad.png'), 'wb') as f:
+                f.write(b'<html>404</html>')
+            write_wav(os.path.join(asset_paths['music'], 'bed.wav'), 0, 0.01)
+            auramixer.pygame.image.save(auramixer.pygame.Surface((8, 8)), os.path.join(temp_dir, 'cover.png'))
+            os.replace(os.path.join(temp_dir, 'cover.png'), os.path.join(asset_paths['music'], 'cover.mp3')) # An image named like audio
+
+            with patch('auramixer.decode_asset', wraps=auramixer.decode_asset) as mock_decode:
+                loader = auramixer.AssetLoader(asset_paths).start()
+                loader.wait()
+            mock_decode.assert_called_once_with('backgrounds', os.path.join(asset_paths['backgrounds'], 'good.png'))
+            self.assertEqual([track.name for track in loader.assets['music']], ['bed.wav'])
+            self.assertFalse(loader.assets['music'][0].needs_conversion((44100, -16, 2))) # Known from the header alone
+            self.assertEqual(sorted(os.path.basename(path) for path in loader.manifest.rejected), ['bad.png', 'cover.mp3'])
+            self.assertTrue(os.path.exists(os.path.join(temp_dir, '.cache', 'manifest.json')))
+
+            with patch('auramixer.probe_media_file') as mock_probe:
+                warm = auramixer.AssetManifest(asset_paths)
+                self.assertEqual(len(warm.scan()['backgrounds']), 1)
+            mock_probe.assert_not_called()
+
+    def test_import_does_not_load_tkinter(self):
+        """Tests that tkinter is only imported when a dialog is actually shown."""
+        check = "import sys, auramixer; print('tkinter' in sys.modules)"
+        output = subprocess.run([sys.executable, '-c', check], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip().splitlines()[-1], 'False')
+
 if __name__ == '__main__':
     # This allows the test to be run from the command line.
     unittest.main()